@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from json import dumps as jdump
 from keycov.analysis_runner import run_analyses
 from keycov.args import args, Namespace, parse_args
-from keycov.parse_kle import parse_kle
+from keycov.ingest import read_layouts
+from keycov.key import Key
+from keycov.layout_cache import default_cache_dir, LayoutCache
 from keycov.path import get_json_and_yaml_files
 from keycov.text_output import output_as_text
-from keycov.util import dict_union, key_pretty_name, serialise_key, snd
-from math import ceil, sqrt
+from keycov.util import dict_union, snd
 from os import linesep
 from sys import argv, exit
 from typing import List, Tuple, Union
@@ -20,7 +24,7 @@ def main(args:[str]) -> int:
     # Perform the analysis
     exit_code:int
     coverage_data:List[dict]
-    de_primer:dict
+    key_table:[Key]
     known_paths:[str]
     (exit_code, coverage_data, known_paths) = keycov(pargs)
 
@@ -45,65 +49,58 @@ def keycov(pargs:Union[Namespace, dict]) -> Tuple[int, dict, List[str]]:
         dargs = dict(map(lambda d: (d['dest'], d['default']), args))
         pargs = Namespace(**dict_union(dargs, pargs))
 
-    # Collect input data
-    input_layout_files:[str] = get_json_and_yaml_files(pargs.input_dir)
-    target_layout_files:[str] = get_json_and_yaml_files(pargs.targets)
-    input_layouts:[[dict]] = list(map(parse_named_kle, input_layout_files))
-    target_layouts:[[dict]] = list(map(parse_named_kle, target_layout_files))
+    # Collect input data concurrently, reusing the layouts parsed by previous runs where possible
+    layout_cache:LayoutCache = LayoutCache(pargs.cache_dir if pargs.cache_dir else default_cache_dir(), pargs.cache_budget * 2 ** 20) if not pargs.no_cache else None
+    input_layout_files:[str]
+    target_layout_files:[str]
+    with ThreadPoolExecutor(max_workers=2) as discovery_pool:
+        (input_layout_files, target_layout_files) = discovery_pool.map(get_json_and_yaml_files, [pargs.input_dir, pargs.targets])
     known_paths:[str] = input_layout_files + target_layout_files
+    layouts:List[Tuple[str, List[Key]]] = read_layouts(pargs.jobs, layout_cache, known_paths)
+    input_layouts:List[Tuple[str, List[Key]]] = layouts[:len(input_layout_files)]
+    target_layouts:List[Tuple[str, List[Key]]] = layouts[len(input_layout_files):]
+    if layout_cache is not None:
+        layout_cache.evict()
 
     # Prepare data
-    sanitise_layouts(target_layouts + input_layouts)
-    keys:[dict]
-    de_primer:dict
-    (de_primer, keys) = prepare_keys(input_layouts + target_layouts)
+    key_table:[Key]
+    key_ids:dict
+    (key_table, key_ids) = prepare_keys(input_layouts + target_layouts)
+    keys:[int] = list(range(len(key_table)))
+    input_layouts = list(map(partial(pack_layout, key_ids), input_layouts))
+    target_layouts = list(map(partial(pack_layout, key_ids), target_layouts))
 
     # Analyse coverage
     exit_code:int
     coverage_data:List[dict]
-    (exit_code, coverage_data) = run_analyses(pargs, target_layouts, input_layouts, keys, de_primer)
-    coverage_data['~results']['de_primer'] = de_primer
+    (exit_code, coverage_data) = run_analyses(pargs, target_layouts, input_layouts, keys, key_table)
     return (exit_code, coverage_data, known_paths)
 
-def parse_named_kle(fname:str) -> Tuple[str, List[dict]]:
-    return (fname, parse_kle(fname))
-
-def sanitise_layouts(layouts:[dict]):
-    for layout in layouts:
-        for key in layout[1]:
-            key['serialised'] = serialise_key(key)
-            key['pretty-name'] = key_pretty_name(key)
-
-def prepare_keys(layouts:[tuple]) -> Tuple[dict, List[dict]]:
-    prime:iter = primes()
-    seen_keys:dict = {}
-    de_primer:dict = {}
+##
+# @brief Number the distinct keys of the given layouts densely from 0
+#
+# @param layouts:[tuple] Named layouts
+#
+# @return A table of the keys by their ids, and the ids of the keys by their serialisations
+def prepare_keys(layouts:[tuple]) -> Tuple[List[Key], dict]:
+    key_ids:dict = {}
+    key_table:[Key] = []
     for layout in map(snd, layouts):
-        for ki in range(len(layout)):
-            key:dict = layout[ki]
-            if key['serialised'] not in seen_keys:
-                p:int = next(prime)
-                seen_keys[key['serialised']] = p
-                de_primer[p] = key
-            layout[ki] = seen_keys[key['serialised']]
-
-    return (de_primer, list(de_primer.keys()))
-
-def primes() -> [int]:
-    i:int = 3
-    while True:
-        yield i
-        while True:
-            i += 2
-            if is_prime(i):
-                break
-
-def is_prime(n:int) -> bool:
-    # Assume n >= 3
-    for i in range(2, ceil(sqrt(n)) + 1):
-        if n % i == 0:
-            return False
-    return True
+        for key in layout:
+            if key.serialised not in key_ids:
+                key_ids[key.serialised] = len(key_table)
+                key_table.append(key)
+    return (key_table, key_ids)
+
+##
+# @brief Represent a layout as a compact array of the ids of its keys
+#
+# @param key_ids:dict The ids of the keys by their serialisations
+# @param layout:Tuple[str, List[dict]] A named layout
+#
+# @return The named array of key ids
+def pack_layout(key_ids:dict, layout:Tuple[str, List[Key]]) -> Tuple[str, array]:
+    return (layout[0], array('H' if len(key_ids) <= 2 ** 16 else 'L', map(lambda key: key_ids[key.serialised], layout[1])))
 
 if __name__ == '__main__':
     exit(main(argv))
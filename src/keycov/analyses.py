@@ -1,8 +1,13 @@
-from .util import add, concat, fst, snd, swp
-from .coverage_analyser import get_covering_sets, get_uncovered
+from .util import fst, snd, swp
+from .coverage_analyser import count_covering_sets, get_best_covering_sets, get_covering_set_of_lowest_cardinality, get_covering_set_of_lowest_units, get_covering_sets, get_kit_usage, get_uncovered, get_uncovered_from_totals
+from .incidence import incidence_uncovered
+from .key import Key
+from .search_statistics import merge_statistics, SearchStatistics
 from argparse import Namespace
 from functools import partial, reduce
-from typing import List, Tuple
+from itertools import islice
+from time import time
+from typing import Callable, Iterator, List, Tuple, Union
 
 DEFAULT_VERBOSITY:int = 1
 
@@ -27,6 +32,55 @@ class FailedAnalysisResult:
     def __init__(self, result):
         self.result = result
 
+class InstrumentedAnalysisResult:
+    result:object
+    statistics:SearchStatistics
+    def __init__(self, result, statistics:SearchStatistics):
+        self.result = result
+        self.statistics = statistics
+
+##
+# @brief A value known only partially as a search ran out of time, which is output as its relation to the true value, for example '≥ 12'
+class Bound:
+    value:object
+    relation:str
+    def __init__(self, value, relation:str):
+        self.value = value
+        self.relation = relation
+
+    def __str__(self) -> str:
+        return '%s %s' % (self.relation, str(self.value))
+
+    def __add__(self, other) -> 'Bound':
+        return Bound(self.value + bound_value(other), self.relation)
+
+    def __radd__(self, other) -> 'Bound':
+        return self.__add__(other)
+
+    def __sub__(self, other) -> 'Bound':
+        return Bound(self.value - bound_value(other), self.relation)
+
+    def __eq__(self, other) -> bool:
+        return self.value == bound_value(other)
+
+    def __ne__(self, other) -> bool:
+        return self.value != bound_value(other)
+
+    def __lt__(self, other) -> bool:
+        return self.value < bound_value(other)
+
+    def __gt__(self, other) -> bool:
+        return self.value > bound_value(other)
+
+    def __int__(self) -> int:
+        return int(self.value)
+
+    def __float__(self) -> float:
+        return float(self.value)
+
+def bound_value(v:object) -> object:
+    return v.value if type(v) == Bound else v
+
 analyses:[dict] = [
     {
         'name': 'num_keebs',
@@ -42,13 +96,15 @@ analyses:[dict] = [
         'name': '~most_common_kit_keys',
         'pretty-name': 'Most common keys in kits',
         'description': 'The keys which are the most common in the kits presented',
-        'verbosity': 2
+        'verbosity': 2,
+        'uses': [ 'key_index' ]
     },
     {
         'name': '~most_common_keeb_keys',
         'pretty-name': 'Most common keys in keyboards',
         'description': 'The keys which are the most common in the keyboards presented',
-        'verbosity': 2
+        'verbosity': 2,
+        'uses': [ 'key_index' ]
     },
     {
         'name': 'most_common_kit_keys_format',
@@ -72,11 +128,13 @@ analyses:[dict] = [
         'name': 'count_units',
         'pretty-name': 'Total units',
         'description': 'The total number of units present in a given layout',
-        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.INDIVIDUAL_KITS | AnalysisTypes.INDIVIDUAL_KEEBS
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.INDIVIDUAL_KITS | AnalysisTypes.INDIVIDUAL_KEEBS,
+        'uses': [ 'unit_costs' ]
     },
     {
         'name': '~compute_covering_set',
-        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KITS | AnalysisTypes.ITERATE_KEEBS
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KITS | AnalysisTypes.ITERATE_KEEBS,
+        'always-run': True
     },
     {
         'name': 'exists_covering_set',
@@ -91,31 +149,23 @@ analyses:[dict] = [
         'name': 'number_of_covering_sets',
         'pretty-name': 'Number of covering sets',
         'description': 'The number of sets of kits which cover a given keyboard',
-        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.INDIVIDUAL_KITS | AnalysisTypes.INDIVIDUAL_KEEBS,
-        'requires': [
-            '~compute_covering_set'
-        ]
-    },
-    {
-        'name': '~count_covering_set_units',
-        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.INDIVIDUAL_KEEBS,
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KITS | AnalysisTypes.ITERATE_KEEBS,
         'requires': [
             '~compute_covering_set'
         ]
     },
     {
         'name': '~covering_set_of_lowest_units',
-        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.INDIVIDUAL_KEEBS,
-        'requires': [
-            '~count_covering_set_units'
-        ]
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KEEBS,
+        'uses': [ 'unit_costs' ]
     },
     {
         'name': '~covering_set_of_lowest_units_surplus',
         'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.INDIVIDUAL_KEEBS,
         'requires': [
             '~covering_set_of_lowest_units'
-        ]
+        ],
+        'uses': [ 'unit_costs' ]
     },
     {
         'name': 'covering_set_of_lowest_units_surplus_amount',
@@ -137,19 +187,10 @@ analyses:[dict] = [
             '~covering_set_of_lowest_units_surplus'
         ]
     },
-    {
-        'name': '~covering_set_cardinalities',
-        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.INDIVIDUAL_KEEBS,
-        'requires': [
-            '~compute_covering_set'
-        ]
-    },
     {
         'name': '~covering_set_of_lowest_cardinality',
-        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.INDIVIDUAL_KEEBS,
-        'requires': [
-            '~covering_set_cardinalities'
-        ]
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KEEBS,
+        'uses': [ 'unit_costs' ]
     },
     {
         'name': 'covering_set_of_lowest_cardinality_amount',
@@ -171,12 +212,45 @@ analyses:[dict] = [
             '~covering_set_of_lowest_cardinality'
         ]
     },
+    {
+        'name': '~best_covering_sets_by_units',
+        'verbosity': 3,
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KEEBS,
+        'uses': [ 'unit_costs' ]
+    },
+    {
+        'name': 'best_covering_sets_by_units_surplus',
+        'pretty-name': 'Least-surplus covering sets',
+        'description': 'The sets of kits with the fewest surplus units which cover a particular keyboard, best first, up to the number requested with --best-covering-sets',
+        'verbosity': 3,
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.INDIVIDUAL_KEEBS,
+        'requires': [
+            '~best_covering_sets_by_units'
+        ],
+        'uses': [ 'unit_costs' ]
+    },
+    {
+        'name': '~best_covering_sets_by_cardinality',
+        'verbosity': 3,
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KEEBS,
+        'uses': [ 'unit_costs' ]
+    },
+    {
+        'name': 'best_covering_sets_by_cardinality_format',
+        'pretty-name': 'Smallest covering sets',
+        'description': 'The sets of the fewest kits which cover a particular keyboard, best first, up to the number requested with --best-covering-sets',
+        'verbosity': 3,
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.INDIVIDUAL_KEEBS,
+        'requires': [
+            '~best_covering_sets_by_cardinality'
+        ]
+    },
     {
         'name': 'most_cumbersome_keyboard',
         'pretty-name': 'Keyboard requiring the most kits',
         'description': 'The keyboard which requires a customer to purchase the most kits in order to cover it',
         'requires': [
-            '~covering_set_cardinalities'
+            '~covering_set_of_lowest_cardinality'
         ]
     },
     {
@@ -184,16 +258,21 @@ analyses:[dict] = [
         'pretty-name': 'Keyboard with most surplus units to cover',
         'description': 'The keyboard which requires the most wasted units of plastic to cover it',
         'requires': [
-            '~covering_set_of_lowest_units'
+            '~covering_set_of_lowest_units_surplus'
         ]
     },
+    {
+        'name': '~covering_set_kit_usage',
+        'verbosity': 2,
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KEEBS
+    },
     {
         'name': 'least_used_kit',
         'pretty-name': 'Least-required kit',
         'description': 'The kit which is required in by fewest keyboards',
         'verbosity': 2,
         'requires': [
-            '~compute_covering_set',
+            '~covering_set_kit_usage',
         ]
     },
     {
@@ -221,7 +300,8 @@ analyses:[dict] = [
         'description': 'Whether every key in every kit is a part of some keyboard (and so not useless)',
         'requires': [
             'exists_covering_set',
-        ]
+        ],
+        'required-roles': [ 'kits' ]
     },
     {
         'name': 'all_keebs_covered',
@@ -229,6 +309,23 @@ analyses:[dict] = [
         'description': 'Whether every key in every keyboard is a part of some kit (and so not missing)',
         'requires': [
             'exists_covering_set',
+        ],
+        'required-roles': [ 'keebs' ]
+    },
+    {
+        'name': 'search_statistics',
+        'pretty-name': 'Search statistics',
+        'description': 'The work done searching for the covering sets of a layout: nodes expanded, branches pruned, memo hits, peak memo size and search depth, and wall time in seconds',
+        'verbosity': 4,
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.INDIVIDUAL_KITS | AnalysisTypes.INDIVIDUAL_KEEBS,
+        'requires': [
+            '~compute_covering_set',
+            'number_of_covering_sets',
+            '~covering_set_of_lowest_units',
+            '~covering_set_of_lowest_cardinality',
+            '~best_covering_sets_by_units',
+            '~best_covering_sets_by_cardinality',
+            '~covering_set_kit_usage',
         ]
     },
     {
@@ -236,23 +333,27 @@ analyses:[dict] = [
         'pretty-name': 'Uncovered keys',
         'description': 'A list of uncovered keys',
         'verbosity': 2,
-        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KITS | AnalysisTypes.ITERATE_KEEBS
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KITS | AnalysisTypes.ITERATE_KEEBS,
+        'uses': [ 'key_index', 'incidence' ]
     },
     {
         'name': 'key_to_kit_membership',
         'pretty-name': 'Present in kits',
         'description': 'A list of kits which contain some key',
         'verbosity': 2,
-        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KIT_KEYS
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KIT_KEYS,
+        'uses': [ 'key_index' ]
     },
     {
         'name': 'key_to_keeb_membership',
         'pretty-name': 'Present in keyboards',
         'description': 'A list of keyboards which contain some key',
         'verbosity': 2,
-        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KEEB_KEYS
+        'analysis-properties': AnalysisTypes.LOCAL | AnalysisTypes.ITERATE_KEEB_KEYS,
+        'uses': [ 'key_index' ]
     }
 ]
+analyses_dict:dict = { a['name']: a for a in analyses }
 
 def num_keebs(_1:Namespace, _2:dict, target_layouts:[dict], _3:[dict]) -> int:
     return len(target_layouts)
@@ -260,84 +361,215 @@ def num_keebs(_1:Namespace, _2:dict, target_layouts:[dict], _3:[dict]) -> int:
 def num_kits(_1:Namespace, _2:dict, _3:[dict], input_layouts:[dict]) -> int:
     return len(input_layouts)
 
-def most_common_kit_keys(pargs:Namespace, _1:dict, target_layouts:[dict], _2:[dict]) -> [str]:
-    return most_common_keys(target_layouts, pargs.output_list_cutoff)
+def most_common_kit_keys(pargs:Namespace, results:dict, _1:[dict], _2:[dict]) -> [str]:
+    return most_common_keys(results['key_index']['kits'], pargs.output_list_cutoff)
 
-def most_common_keeb_keys(pargs:Namespace, _1:dict, _2:[dict], input_layouts:[dict]) -> [str]:
-    return most_common_keys(input_layouts, pargs.output_list_cutoff)
+def most_common_keeb_keys(pargs:Namespace, results:dict, _1:[dict], _2:[dict]) -> [str]:
+    return most_common_keys(results['key_index']['keebs'], pargs.output_list_cutoff)
 
-def most_common_keys(layouts:[dict], output_cutoff:int) -> [str]:
-    key_occurrences:dict = count_key_occurrences(layouts)
-    sorted_occurrences:[str] = list(sorted(key_occurrences.items(), key=swp))
+def most_common_keys(role_index:dict, output_cutoff:int) -> [str]:
+    sorted_occurrences:[str] = list(sorted(role_index['totals'].items(), key=swp))
 
     if output_cutoff > 0:
         return sorted_occurrences[:output_cutoff]
     return sorted_occurrences
 
 def most_common_kit_keys_format(_1:Namespace, results:dict, _2:[dict], _3:[dict]) -> [str]:
-    return format_key_occurrences(results['de_primer'], results['most_common_keeb_keys'])
+    return format_key_occurrences(results['key_table'], results['most_common_kit_keys'])
 
 def most_common_keeb_keys_format(_1:Namespace, results:dict, _2:[dict], _3:[dict]) -> [str]:
-    return format_key_occurrences(results['de_primer'], results['most_common_kit_keys'])
-
-def format_key_occurrences(de_primer:dict, key_occurrences:[Tuple[int, str]]) -> [str]:
-    return list(map(lambda p: '%s (%d)' % (de_primer[p[0]]['pretty-name'], p[1]), key_occurrences))
-
-def count_key_occurrences(layouts:Tuple[str, List[dict]]) -> dict:
+    return format_key_occurrences(results['key_table'], results['most_common_keeb_keys'])
+
+def format_key_occurrences(key_table:[Key], key_occurrences:[Tuple[int, str]]) -> [str]:
+    return list(map(lambda p: '%s (%d)' % (key_table[p[0]].pretty_name, p[1]), key_occurrences))
+
+##
+# @brief Index the layouts of both roles by the keys they contain, so that analyses of keys and of the keys of layouts need not scan every layout
+#
+# @param keeb_layouts:List[Tuple[str, List[int]]] The keyboards
+# @param kit_layouts:List[Tuple[str, List[int]]] The kits
+#
+# @return For each of 'keebs' and 'kits', the index of its layouts, along with the role of each layout under 'roles'
+def index_keys(keeb_layouts:List[Tuple[str, List[int]]], kit_layouts:List[Tuple[str, List[int]]]) -> dict:
+    roles:dict = {}
+    for role,layouts in [('keebs', keeb_layouts), ('kits', kit_layouts)]:
+        for name,_ in layouts:
+            roles[name] = 'both' if roles.get(name, role) != role else role
+    return { 'keebs': index_role_keys(keeb_layouts), 'kits': index_role_keys(kit_layouts), 'roles': roles }
+
+##
+# @brief Index some layouts by the keys they contain
+#
+# @param layouts:List[Tuple[str, List[int]]] The layouts to index
+#
+# @return The number of occurrences of each key in each layout which contains it, under 'occurrences', in the order of the layouts, and in all of the layouts together, under 'totals'
+def index_role_keys(layouts:List[Tuple[str, List[int]]]) -> dict:
     occurrences:dict = {}
-    for layout in layouts:
-        for key in layout[1]:
-            if key in occurrences:
-                occurrences[key] += 1
-            else:
-                occurrences[key] = 1
-    return occurrences
+    totals:dict = {}
+    for name,keys in layouts:
+        for key in keys:
+            key_occurrences:dict = occurrences.get(key)
+            if key_occurrences is None:
+                key_occurrences = occurrences[key] = {}
+            key_occurrences[name] = key_occurrences.get(name, 0) + 1
+            totals[key] = totals.get(key, 0) + 1
+    return { 'occurrences': occurrences, 'totals': totals }
 
 def count_units(aargs:Namespace, _2:dict, layout:tuple) -> float:
-    return get_total_units(aargs.de_primer, layout)
-
-def get_total_units(de_primer:dict, layout:Tuple[str, List[dict]]) -> float:
-    return reduce(lambda a,b: a + b, map(partial(get_units, de_primer), layout[1]), 0.0)
-
-def get_units(de_primer:dict, key_prime:int) -> float:
-    key:dict = de_primer[key_prime]
-    considered_dims:[float] = [key['w'], key['h']]
-    extra_dims:[float] = [key['w2'], key['h2']]
+    return aargs.unit_costs['layouts'][layout[0]]
+
+##
+# @brief Compute the units of every key and layout once, so that searches and analyses look them up
+#
+# @param key_units:[float] The units of each key, by id
+# @param layouts:List[Tuple[str, List[int]]] The keyboards and kits
+# @param incidence:dict The incidence matrices of the layouts, or None
+#
+# @return The units of each key by id under 'keys' and of each layout by name under 'layouts'
+def get_unit_costs(key_units:[float], layouts:List[Tuple[str, List[int]]], incidence:dict) -> dict:
+    layout_units:dict
+    if incidence is not None and incidence['units'] is not None:
+        layout_units = incidence['units']
+    else:
+        layout_units = { l[0]: get_total_units(key_units, l) for l in layouts }
+    return { 'keys': key_units, 'layouts': layout_units }
+
+def get_total_units(key_units:[float], layout:Tuple[str, List[dict]]) -> float:
+    return reduce(lambda a,b: a + b, map(key_units.__getitem__, layout[1]), 0.0)
+
+def get_units(key_table:[Key], key_id:int) -> float:
+    key:Key = key_table[key_id]
+    considered_dims:[float] = [key.w, key.h]
+    extra_dims:[float] = [key.w2, key.h2]
     if any(map(lambda v: v != 1, extra_dims)):
         considered_dims += extra_dims
     return max(considered_dims)
 
-def compute_covering_set(pargs:Namespace, _:dict, keeb:Tuple[str, List[dict]], kits:List[Tuple[str, List[dict]]]) -> List[Tuple[str, List[dict]]]:
-    covering_sets:List[Tuple[str, List[dict]]] = get_covering_sets(pargs.approximate_coverage_analysis, keeb, kits)
-    if not covering_sets:
-        return FailedAnalysisResult(covering_sets)
+##
+# @brief Run a search, recording the work it does and stopping it when the time budgets of its layout or the whole run are spent
+#
+# @param aargs:Namespace Analysis arguments, which hold the time budgets
+# @param results:dict Results of previous analyses, which include the time spent searching each layout
+# @param layout:Tuple[str, List[dict]] The layout being searched
+# @param search:Callable Performs the search given the statistics to update
+#
+# @return The result of the search along with its statistics
+def instrumented(aargs:Namespace, results:dict, layout:Tuple[str, List[dict]], search:Callable) -> InstrumentedAnalysisResult:
+    stats:SearchStatistics = SearchStatistics(search_deadline(aargs, results, layout))
+    stats.start()
+    result:object = search(stats)
+    stats.stop()
+    return InstrumentedAnalysisResult(result, stats)
+
+def search_deadline(aargs:Namespace, results:dict, layout:Tuple[str, List[dict]]) -> float:
+    deadlines:[float] = []
+    if aargs.time_budget > 0:
+        time_spent:float = sum(map(lambda s: s['wall-time'], results.get('layout_search_statistics', {}).get(layout[0], {}).values()))
+        deadlines.append(time() + aargs.time_budget - time_spent)
+    if aargs.deadline is not None:
+        deadlines.append(aargs.deadline)
+    return min(deadlines) if deadlines != [] else None
+
+def timed_out(results:dict, layout:Tuple[str, List[dict]], func_name:str) -> bool:
+    return results.get('layout_search_statistics', {}).get(layout[0], {}).get(func_name, {}).get('timed-out', False)
+
+##
+# @brief Check whether the search of an analysis ran out of time on any of some layouts, in which case aggregates of its results are unknown as they would be formed from bounds
+#
+# @param results:dict Results so far, including the search statistics of each layout
+# @param layouts:List[Tuple[str, List[dict]]] The layouts
+# @param func_name:str The function name of the analysis
+#
+# @return True iff the search ran out of time on some layout
+def any_timed_out(results:dict, layouts:List[Tuple[str, List[dict]]], func_name:str) -> bool:
+    return any(map(lambda l: timed_out(results, l, func_name), layouts))
+
+##
+# @brief Find the covering sets of a layout. These are only kept if they are to be output, otherwise the search stops at the first and only their existence is recorded, as True, or None if the search ran out of time
+def compute_covering_set(pargs:Namespace, results:dict, keeb:Tuple[str, List[dict]], kits:List[Tuple[str, List[dict]]]) -> InstrumentedAnalysisResult:
+    return instrumented(pargs, results, keeb, partial(compute_covering_set_with_statistics, pargs, keeb, kits))
+
+def compute_covering_set_with_statistics(pargs:Namespace, keeb:Tuple[str, List[dict]], kits:List[Tuple[str, List[dict]]], stats:SearchStatistics) -> List[Tuple[str, List[dict]]]:
+    covering_sets:Iterator[List[Tuple[str, List[dict]]]] = limit_covering_sets(pargs, get_covering_sets(pargs.approximate_coverage_analysis, keeb, kits, pargs.minimal_covering_sets, pargs.superset_covering_sets, stats, pargs.state_budget * 2 ** 20))
+    if not covering_sets_output(pargs):
+        if next(covering_sets, None) is not None:
+            return True
+        return None if stats.timed_out else FailedAnalysisResult(False)
+    covering_sets_list:List[List[Tuple[str, List[dict]]]] = sorted(covering_sets)
+    if not covering_sets_list and not stats.timed_out:
+        return FailedAnalysisResult(covering_sets_list)
+    return covering_sets_list
+
+def limit_covering_sets(pargs:Namespace, covering_sets:Iterator[List[Tuple[str, List[dict]]]]) -> Iterator[List[Tuple[str, List[dict]]]]:
+    if pargs.max_covering_sets > 0:
+        return islice(covering_sets, pargs.max_covering_sets)
     return covering_sets
 
 def exists_covering_set(_1:dict, coverage_data:dict, layout:[dict]) -> bool:
-    return coverage_data['compute_covering_set'][layout[0]] != []
+    covering_sets:Union[bool, List[List[Tuple[str, List[dict]]]]] = coverage_data['compute_covering_set'][layout[0]]
+    if type(covering_sets) != list:
+        return covering_sets
+    if covering_sets == [] and timed_out(coverage_data, layout, 'compute_covering_set'):
+        return None
+    return covering_sets != []
 
 def all_keebs_covered(_1:dict, coverage_data:dict, keebs:List[Tuple[str, List[dict]]], _2:List[Tuple[str, List[dict]]]) -> bool:
-    keeb_names:list = list(map(fst, keebs))
-    return all(map(snd, filter(lambda p: p[0] in keeb_names, coverage_data['exists_covering_set'].items())))
+    return all_layouts_covered(coverage_data, keebs)
 
 def all_kits_covered(_1:dict, coverage_data:dict, _2:List[Tuple[str, List[dict]]], kits:List[Tuple[str, List[dict]]]) -> bool:
-    kit_names:list = list(map(fst, kits))
-    return all(map(snd, filter(lambda p: p[0] in kit_names, coverage_data['exists_covering_set'].items())))
-
-def number_of_covering_sets(_1:dict, coverage_data:dict, layout:[dict]) -> int:
-    return len(coverage_data['compute_covering_set'][layout[0]])
-
-def count_covering_set_units(aargs:Namespace, coverage_data:dict, keeb:Tuple[str, List[dict]]) -> Tuple[str, List[dict]]:
-    css:List[Tuple[str, List[dict]]] = coverage_data['compute_covering_set'][keeb[0]]
-    return list(map(lambda cs: (reduce(add, map(lambda s: get_total_units(aargs.de_primer, s), cs), 0.0), cs), css))
-
-def covering_set_of_lowest_units(_1:Namespace, coverage_data:dict, keeb:Tuple[str, List[dict]]) -> Tuple[str, List[dict]]:
-    csus:List[Tuple[str, List[dict]]] = coverage_data['count_covering_set_units'][keeb[0]]
-    return min(csus, key=fst) if len(csus) != 0 else None
+    return all_layouts_covered(coverage_data, kits)
+
+def all_layouts_covered(coverage_data:dict, layouts:List[Tuple[str, List[dict]]]) -> Union[bool, FailedAnalysisResult]:
+    covered:bool = all_known(map(lambda l: coverage_data['exists_covering_set'][l[0]], layouts))
+    return FailedAnalysisResult(covered) if covered is False else covered
+
+##
+# @brief Decide whether all of some values hold, some of which may be unknown as their searches ran out of time
+#
+# @param values:Iterator[bool] The values, which are None if unknown
+#
+# @return False if any value is False, otherwise None if any value is unknown, otherwise True
+def all_known(values:Iterator[bool]) -> bool:
+    values:[bool] = list(values)
+    if any(map(lambda v: v is False, values)):
+        return False
+    if any(map(lambda v: v is None, values)):
+        return None
+    return True
+
+def number_of_covering_sets(pargs:Namespace, coverage_data:dict, layout:Tuple[str, List[dict]], const_layouts:List[Tuple[str, List[dict]]]) -> int:
+    if covering_sets_output(pargs):
+        num_covering_sets:int = len(coverage_data['compute_covering_set'][layout[0]])
+        return Bound(num_covering_sets, '≥') if timed_out(coverage_data, layout, 'compute_covering_set') else num_covering_sets
+    return instrumented(pargs, coverage_data, layout, partial(count_limited_covering_sets, pargs, layout, const_layouts))
+
+def count_limited_covering_sets(pargs:Namespace, layout:Tuple[str, List[dict]], const_layouts:List[Tuple[str, List[dict]]], stats:SearchStatistics) -> int:
+    num_covering_sets:int = count_covering_sets(pargs.approximate_coverage_analysis, layout, const_layouts, pargs.minimal_covering_sets, pargs.superset_covering_sets, pargs.subcover_memo, stats, pargs.state_budget * 2 ** 20)
+    if pargs.max_covering_sets > 0 and num_covering_sets >= pargs.max_covering_sets:
+        return pargs.max_covering_sets
+    return Bound(num_covering_sets, '≥') if stats.timed_out else num_covering_sets
+
+def covering_sets_output(pargs:Namespace) -> bool:
+    return pargs.output_format in ['json', 'yaml'] and is_selected(pargs, analyses_dict['~compute_covering_set'])
+
+##
+# @brief Decide whether the results of an analysis are to be output, which are those named by --only if given, otherwise those within the verbosity
+#
+# @param aargs:Namespace Analysis arguments
+# @param analysis:dict The analysis
+#
+# @return Whether the analysis is to be output
+def is_selected(aargs:Namespace, analysis:dict) -> bool:
+    if aargs.selected_analyses:
+        return analysis['name'] in aargs.selected_analyses
+    return aargs.analysis_verbosity >= analysis.get('verbosity', DEFAULT_VERBOSITY)
+
+def covering_set_of_lowest_units(aargs:Namespace, results:dict, keeb:Tuple[str, List[dict]], kits:List[Tuple[str, List[dict]]]) -> InstrumentedAnalysisResult:
+    return instrumented(aargs, results, keeb, partial(get_bounded_optimal_covering_set, get_covering_set_of_lowest_units, keeb, kits, aargs.unit_costs))
 
 def covering_set_of_lowest_units_surplus(aargs:Namespace, coverage_data:dict, keeb:Tuple[str, List[dict]]) -> float:
     cs:Tuple[float, List[Tuple[str, List[dict]]]] = coverage_data['covering_set_of_lowest_units'][keeb[0]]
-    return (cs[0] - get_total_units(aargs.de_primer, keeb), list(map(fst, cs[1]))) if cs != None else None
+    return (cs[0] - aargs.unit_costs['layouts'][keeb[0]], list(map(fst, cs[1]))) if cs != None else None
 
 def covering_set_of_lowest_units_surplus_amount(_1:Namespace, coverage_data:dict, keeb:Tuple[str, List[dict]]) -> [str]:
     cset:Tuple[int, List[Tuple[str, List[dict]]]] = coverage_data['covering_set_of_lowest_units_surplus'][keeb[0]]
@@ -347,13 +579,16 @@ def covering_set_of_lowest_units_surplus_value(_1:Namespace, coverage_data:dict,
     cset:Tuple[int, List[Tuple[str, List[dict]]]] = coverage_data['covering_set_of_lowest_units_surplus'][keeb[0]]
     return cset[1] if cset != None else None
 
-def covering_set_cardinalities(_1:Namespace, coverage_data:dict, keeb:Tuple[str, List[dict]]) -> float:
-    css:List[Tuple[str, List[dict]]] = coverage_data['compute_covering_set'][keeb[0]]
-    return list(map(lambda cs: (len(cs), cs), css))
+def covering_set_of_lowest_cardinality(aargs:Namespace, results:dict, keeb:Tuple[str, List[dict]], kits:List[Tuple[str, List[dict]]]) -> InstrumentedAnalysisResult:
+    return instrumented(aargs, results, keeb, partial(get_bounded_optimal_covering_set, get_covering_set_of_lowest_cardinality, keeb, kits, aargs.unit_costs))
 
-def covering_set_of_lowest_cardinality(_1:Namespace, coverage_data:dict, keeb:Tuple[str, List[dict]]) -> float:
-    cscs:List[int, Tuple[str, List[dict]]] = coverage_data['covering_set_cardinalities'][keeb[0]]
-    return min(cscs, key=fst) if cscs != [] else None
+##
+# @brief Find an optimal covering set, or if the search runs out of time, the best found so far whose cost bounds the optimum from above
+def get_bounded_optimal_covering_set(get_optimal_covering_set:Callable, keeb:Tuple[str, List[dict]], kits:List[Tuple[str, List[dict]]], unit_costs:dict, stats:SearchStatistics) -> Tuple[Union[float, Bound], List[Tuple[str, List[dict]]]]:
+    optimal_covering_set:Tuple[float, List[Tuple[str, List[dict]]]] = get_optimal_covering_set(keeb, kits, unit_costs, stats)
+    if optimal_covering_set is None or not stats.timed_out:
+        return optimal_covering_set
+    return (Bound(optimal_covering_set[0], '≤'), optimal_covering_set[1])
 
 def covering_set_of_lowest_cardinality_amount(_1:Namespace, coverage_data:dict, keeb:Tuple[str, List[dict]]) -> float:
     csc:Tuple[str, List[dict]] = coverage_data['covering_set_of_lowest_cardinality'][keeb[0]]
@@ -372,43 +607,85 @@ def smallest_covering_kit_set_is_minimal_surplus_covering_kit_set(_1:Namespace,
     return smallest_covering_set == minimal_surplus_covering_set
 
 def all_keyboards_have_smallest_covering_kit_set_is_minimal_surplus_covering_kit_set(_1:Namespace, coverage_data:dict, _2:[dict], _3:[dict]) -> bool:
-    return all(coverage_data['smallest_covering_kit_set_is_minimal_surplus_covering_kit_set'].values())
+    return all_known(coverage_data['smallest_covering_kit_set_is_minimal_surplus_covering_kit_set'].values())
+
+def best_covering_sets_by_units(aargs:Namespace, results:dict, keeb:Tuple[str, List[dict]], kits:List[Tuple[str, List[dict]]]) -> InstrumentedAnalysisResult:
+    return instrumented(aargs, results, keeb, partial(get_limited_best_covering_sets, aargs, keeb, kits, True))
+
+def best_covering_sets_by_units_surplus(aargs:Namespace, coverage_data:dict, keeb:Tuple[str, List[dict]]) -> [str]:
+    keeb_units:float = aargs.unit_costs['layouts'][keeb[0]]
+    return list(map(lambda p: '%s (%.2f)' % (format_covering_set(p[1]), p[0] - keeb_units), coverage_data['best_covering_sets_by_units'][keeb[0]]))
+
+def best_covering_sets_by_cardinality(aargs:Namespace, results:dict, keeb:Tuple[str, List[dict]], kits:List[Tuple[str, List[dict]]]) -> InstrumentedAnalysisResult:
+    return instrumented(aargs, results, keeb, partial(get_limited_best_covering_sets, aargs, keeb, kits, False))
+
+def best_covering_sets_by_cardinality_format(_1:Namespace, coverage_data:dict, keeb:Tuple[str, List[dict]]) -> [str]:
+    return list(map(lambda p: '%s (%d)' % (format_covering_set(p[1]), p[0]), coverage_data['best_covering_sets_by_cardinality'][keeb[0]]))
+
+def get_limited_best_covering_sets(aargs:Namespace, keeb:Tuple[str, List[dict]], kits:List[Tuple[str, List[dict]]], by_units:bool, stats:SearchStatistics) -> List[Tuple[float, List[str]]]:
+    best_covering_sets:Iterator[Tuple[float, List[Tuple[str, List[dict]]]]] = get_best_covering_sets(keeb, kits, aargs.unit_costs, by_units, aargs.minimal_covering_sets, stats)
+    return list(map(lambda p: (p[0], list(map(fst, p[1]))), islice(best_covering_sets, aargs.best_covering_sets)))
 
-def most_cumbersome_keyboard(_1:Namespace, coverage_data:dict, _2:[dict], _3:[dict]) -> str:
+def format_covering_set(kit_names:[str]) -> str:
+    return ' + '.join(kit_names)
+
+def most_cumbersome_keyboard(_1:Namespace, coverage_data:dict, keebs:[dict], _2:[dict]) -> str:
     lowest_cardinality_covering_sets:List[Tuple[int, str]] = list(map(lambda p: (p[1][0], p[0]), filter(lambda p: p[1] is not None, coverage_data['covering_set_of_lowest_cardinality'].items())))
-    if lowest_cardinality_covering_sets == []:
+    if lowest_cardinality_covering_sets == [] or any_timed_out(coverage_data, keebs, 'covering_set_of_lowest_cardinality'):
         return None
     mck:Tuple[int, str] = max(lowest_cardinality_covering_sets, key=fst)
     return '%s (%d)' %(mck[1], mck[0])
 
-def most_wasteful_keyboard(_1:Namespace, coverage_data:dict, _2:[dict], _3:[dict]) -> str:
+def most_wasteful_keyboard(_1:Namespace, coverage_data:dict, keebs:[dict], _2:[dict]) -> str:
     lowest_units_covering_sets:List[Tuple[float, str]] = list(map(lambda p: (p[1][0], p[0]), filter(lambda p: p[1] is not None, coverage_data['covering_set_of_lowest_units_surplus'].items())))
-    if lowest_units_covering_sets == []:
+    if lowest_units_covering_sets == [] or any_timed_out(coverage_data, keebs, 'covering_set_of_lowest_units'):
         return None
     mwk:Tuple[int, str] = max(lowest_units_covering_sets, key=fst)
     return '%s (%.2f)' %(mwk[1], mwk[0])
 
+def covering_set_kit_usage(pargs:Namespace, results:dict, keeb:Tuple[str, List[dict]], kits:List[Tuple[str, List[dict]]]) -> InstrumentedAnalysisResult:
+    return instrumented(pargs, results, keeb, partial(count_kit_usage, pargs, keeb, kits))
+
+def count_kit_usage(pargs:Namespace, keeb:Tuple[str, List[dict]], kits:List[Tuple[str, List[dict]]], stats:SearchStatistics) -> dict:
+    if pargs.max_covering_sets == 0:
+        usage:dict = get_kit_usage(pargs.approximate_coverage_analysis, keeb, kits, pargs.minimal_covering_sets, pargs.superset_covering_sets, stats, pargs.state_budget * 2 ** 20)
+    else:
+        # Only the first covering sets found are considered, so these are formed
+        usage:dict = {}
+        for covering_set in limit_covering_sets(pargs, get_covering_sets(pargs.approximate_coverage_analysis, keeb, kits, pargs.minimal_covering_sets, pargs.superset_covering_sets, stats, pargs.state_budget * 2 ** 20)):
+            for kit,_ in covering_set:
+                usage[kit] = usage.get(kit, 0) + 1
+    if stats.timed_out:
+        return { kit: Bound(n, '≥') for kit,n in usage.items() }
+    return usage
+
 def least_used_kit(_1:Namespace, coverage_data:dict, keebs:[dict], kits:[dict]) -> str:
     keeb_names:[str] = list(map(fst, keebs))
-    keebs_with_non_disjoint_kits:List[str, List[Tuple[str, [dict]]]] = list(map(lambda p: (p[0], reduce(concat, map(lambda cs: list(map(fst, cs)), p[1]), [])), filter(lambda p: p[0] in keeb_names, coverage_data['compute_covering_set'].items())))
-
-    occurrences:dict = { kit: [] for kit,_ in kits }
-    for keeb,non_disjoint_kits in keebs_with_non_disjoint_kits:
-        for kit in non_disjoint_kits:
-            occurrences[kit] += [keeb]
+    kit_usages:[dict] = list(map(snd, filter(lambda p: p[0] in keeb_names, coverage_data['covering_set_kit_usage'].items())))
+    if any_timed_out(coverage_data, keebs, 'covering_set_kit_usage'):
+        return None
 
-    counted_occurrences:List[Tuple[str, int]] = list(map(lambda p: (p[0], len(p[1])), occurrences.items()))
+    counted_occurrences:List[Tuple[str, int]] = list(map(lambda kit: (kit, sum(map(lambda u: u.get(kit, 0), kit_usages))), map(fst, kits)))
     if counted_occurrences == []:
         return None
     luk:Tuple[str, int] = min(counted_occurrences, key=snd)
 
     return '%s (%d)' % luk
 
-def uncovered_keys(pargs:Namespace, _:dict, keeb:Tuple[str, List[dict]], kits:List[Tuple[str, List[dict]]]) -> List[dict]:
-    return get_uncovered(keeb, kits)[:pargs.output_list_cutoff]
+def search_statistics(_1:Namespace, coverage_data:dict, layout:Tuple[str, List[dict]]) -> dict:
+    return merge_statistics(coverage_data['layout_search_statistics'].get(layout[0], {}).values())
+
+def uncovered_keys(pargs:Namespace, results:dict, keeb:Tuple[str, List[dict]], kits:List[Tuple[str, List[dict]]]) -> List[dict]:
+    # The other layouts are those of the other role, unless the layout has both
+    role:str = results['key_index']['roles'].get(keeb[0], 'both')
+    if role == 'both':
+        return get_uncovered(keeb, kits)[:pargs.output_list_cutoff]
+    if pargs.incidence is not None:
+        return incidence_uncovered(pargs.incidence[role], keeb)[:pargs.output_list_cutoff]
+    return get_uncovered_from_totals(keeb, results['key_index']['kits' if role == 'keebs' else 'keebs']['totals'])[:pargs.output_list_cutoff]
 
-def key_to_kit_membership(aargs:Namespace, results:dict, key:int, const_kits:List[Tuple[str, List[int]]]) -> List[str]:
-    return key_to_keeb_membership(aargs, results, key, const_kits)
+def key_to_kit_membership(_1:Namespace, results:dict, key:int, _2:List[Tuple[str, List[int]]]) -> List[str]:
+    return list(results['key_index']['kits']['occurrences'].get(key, {}))
 
-def key_to_keeb_membership(aargs:Namespace, _:dict, key:int, const_keebs:List[Tuple[str, List[int]]]) -> List[str]:
-    return list(map(fst, filter(lambda keeb: key in snd(keeb), const_keebs)))
+def key_to_keeb_membership(_1:Namespace, results:dict, key:int, _2:List[Tuple[str, List[int]]]) -> List[str]:
+    return list(results['key_index']['keebs']['occurrences'].get(key, {}))
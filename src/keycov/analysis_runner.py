@@ -1,33 +1,64 @@
 import keycov.analyses as analyses_mod
-from .analyses import analyses, AnalysisFailedError, AnalysisTypes, DEFAULT_VERBOSITY, FailedAnalysisResult
+from .analyses import analyses, AnalysisFailedError, AnalysisTypes, Bound, DEFAULT_VERBOSITY, FailedAnalysisResult, get_unit_costs, get_units, index_keys, InstrumentedAnalysisResult, is_selected
 from .args import Namespace
 from .coverage_analyser import get_covering_sets
+from .incidence import build_incidence
+from .key import Key
+from .memo import LruMemo
 from .util import dict_union, fst, iconcat, snd
-from functools import reduce
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial, reduce
+from itertools import repeat
 from sys import stderr
+from time import time
 from types import SimpleNamespace
-from typing import Callable, List, Set, Tuple, Union
+from typing import Callable, Dict, List, Set, Tuple, Union
 
-def run_analyses(pargs:Namespace, keeb_layouts:[[dict]], kit_layouts:[[dict]], keys:[int], de_primer:dict) -> Tuple[int, List[dict]]:
+def run_analyses(pargs:Namespace, keeb_layouts:[[dict]], kit_layouts:[[dict]], keys:[int], key_table:[Key]) -> Tuple[int, List[dict]]:
     # Sanitise and linearise analyses
     sanitised_analyses:[dict] = sanitise_analyses(analyses)
-    ordered_analyses:[dict] = linearise_analyses(sanitised_analyses)
 
     # Prepare data-structures
     exit_code:int = 0
     coverage_data:dict = {
-        '~results': { 'de_primer': de_primer },
+        '~results': { 'key_table': key_table, 'key_index': None, 'layout_search_statistics': {} },
         'local-keeb-results': { l[0]:{} for l in keeb_layouts },
         'local-kit-results': { l[0]:{} for l in kit_layouts },
         'local-key-results': { k:{} for k in keys},
         'global-results': {}
     }
 
-    # Prepare the arguments
-    aargs:Namespace = SimpleNamespace(**pargs.__dict__, **{ 'de_primer': de_primer })
+    # Prepare the arguments, the deadline of the whole run is a wall-clock time so that it is shared by the worker processes
+    aargs:Namespace = SimpleNamespace(**pargs.__dict__, **{
+        'key_table': key_table,
+        'subcover_memo': LruMemo(pargs.memo_budget * 2 ** 20) if pargs.memo_budget > 0 else None,
+        'deadline': time() + pargs.total_time_budget if pargs.total_time_budget > 0 else None,
+        'incidence': None,
+        'unit_costs': None,
+        'selected_analyses': get_analysis_names(sanitised_analyses, pargs.only_analyses),
+        'skipped_analyses': get_analysis_names(sanitised_analyses, pargs.skip_analyses),
+    })
+    ordered_analyses:List[Tuple[dict, Set[str]]] = list(linearise_analyses(sanitised_analyses, partial(is_demanded, aargs), aargs.skipped_analyses))
+
+    # Build the indices used by the planned analyses, the unit costs of layouts are summed from the incidence matrices where these are present
+    uses:Set[str] = set(reduce(iconcat, map(lambda p: list(p[0].get('uses', [])), ordered_analyses), []))
+    if 'key_index' in uses:
+        coverage_data['~results']['key_index'] = index_keys(keeb_layouts, kit_layouts)
+    if 'incidence' in uses or 'unit_costs' in uses:
+        key_units:[float] = list(map(partial(get_units, key_table), range(len(key_table))))
+        aargs.incidence = build_incidence(keeb_layouts, kit_layouts, key_units)
+        if 'unit_costs' in uses:
+            aargs.unit_costs = get_unit_costs(key_units, keeb_layouts + kit_layouts, aargs.incidence)
+
+    # Prepare the worker processes if some search is planned, which each receive the layouts and their index once and keep their own memo of sub-counts
+    pool:ProcessPoolExecutor = None
+    if aargs.jobs > 1 and any(map(lambda p: p[0]['analysis-properties'] & (AnalysisTypes.ITERATE_KITS | AnalysisTypes.ITERATE_KEEBS), ordered_analyses)):
+        worker_aargs:Namespace = SimpleNamespace(**dict_union(aargs.__dict__, { 'subcover_memo': None }))
+        pool = ProcessPoolExecutor(max_workers=aargs.jobs, initializer=init_worker, initargs=(worker_aargs, keeb_layouts, kit_layouts, coverage_data['~results']['key_index']))
 
     # Run the analyses
-    for analysis in ordered_analyses:
+    for analysis,roles in ordered_analyses:
         if not hasattr(analyses_mod, analysis['func-name']):
             print('Analysis function "%s" was requested but is not present in module src.analyses' % analysis['func-name'], file=stderr)
             exit_code = -1
@@ -44,27 +75,30 @@ def run_analyses(pargs:Namespace, keeb_layouts:[[dict]], kit_layouts:[[dict]], k
             if type(ret) == FailedAnalysisResult:
                 exit_code |= analysis['exit-code']
                 ret = ret.result
-            if aargs.analysis_verbosity >= analysis['verbosity']:
+            if is_selected(aargs, analysis):
                 coverage_data['global-results'][analysis['pretty-name']] = ret
             coverage_data['~results'][analysis['func-name']] = ret
         elif props & AnalysisTypes.LOCAL:
             coverage_data['~results'][analysis['func-name']] = {}
             if props & AnalysisTypes.INDIVIDUAL_KITS or props & AnalysisTypes.INDIVIDUAL_KEEBS:
-                if props & AnalysisTypes.INDIVIDUAL_KITS:
+                if props & AnalysisTypes.INDIVIDUAL_KITS and 'kits' in roles:
                     exit_code |= handle_analysis_on_individuals(aargs, analysis, func, coverage_data, 'local-kit-results', kit_layouts)
-                if props & AnalysisTypes.INDIVIDUAL_KEEBS:
+                if props & AnalysisTypes.INDIVIDUAL_KEEBS and 'keebs' in roles:
                     exit_code |= handle_analysis_on_individuals(aargs, analysis, func, coverage_data, 'local-keeb-results', keeb_layouts)
             elif props & AnalysisTypes.ITERATE_KITS or props & AnalysisTypes.ITERATE_KEEBS:
-                if props & AnalysisTypes.ITERATE_KITS:
-                    exit_code |= handle_analysis_iteration(aargs, analysis, func, coverage_data, 'local-kit-results', kit_layouts, keeb_layouts)
-                if props & AnalysisTypes.ITERATE_KEEBS:
-                    exit_code |= handle_analysis_iteration(aargs, analysis, func, coverage_data, 'local-keeb-results', keeb_layouts, kit_layouts)
+                if props & AnalysisTypes.ITERATE_KITS and 'kits' in roles:
+                    exit_code |= handle_analysis_iteration(aargs, analysis, func, coverage_data, 'local-kit-results', kit_layouts, keeb_layouts, pool=pool)
+                if props & AnalysisTypes.ITERATE_KEEBS and 'keebs' in roles:
+                    exit_code |= handle_analysis_iteration(aargs, analysis, func, coverage_data, 'local-keeb-results', keeb_layouts, kit_layouts, pool=pool)
             elif props & AnalysisTypes.ITERATE_KIT_KEYS or props & AnalysisTypes.ITERATE_KEEB_KEYS:
-                if props & AnalysisTypes.ITERATE_KIT_KEYS:
+                if props & AnalysisTypes.ITERATE_KIT_KEYS and 'kits' in roles:
                     exit_code |= handle_analysis_on_keys(aargs, analysis, func, coverage_data, 'local-key-results', keys, kit_layouts)
-                if props & AnalysisTypes.ITERATE_KEEB_KEYS:
+                if props & AnalysisTypes.ITERATE_KEEB_KEYS and 'keebs' in roles:
                     exit_code |= handle_analysis_on_keys(aargs, analysis, func, coverage_data, 'local-key-results', keys, keeb_layouts)
 
+    if pool is not None:
+        pool.shutdown()
+
     sanitised_coverage_data:dict = sanitise(coverage_data)
 
     return (exit_code, sanitised_coverage_data)
@@ -82,29 +116,76 @@ def handle_analysis_on_individuals(aargs:Namespace, analysis:dict, func:Callable
             if type(ret) == FailedAnalysisResult:
                 exit_code |= analysis['exit-code']
                 ret = ret.result
-        if aargs.analysis_verbosity >= analysis['verbosity']:
+        if is_selected(aargs, analysis):
             coverage_data[output_key][const_layout[0]][analysis['pretty-name']] = ret
         coverage_data['~results'][analysis['func-name']][const_layout[0]] = ret
     return exit_code
 
-def handle_analysis_iteration(aargs:Namespace, analysis:dict, func:Callable, coverage_data:dict, output_key:str, iter_layouts:[dict], const_layouts:[[dict]], perform_analysis:bool=True) -> int:
+def handle_analysis_iteration(aargs:Namespace, analysis:dict, func:Callable, coverage_data:dict, output_key:str, iter_layouts:[dict], const_layouts:[[dict]], perform_analysis:bool=True, pool:ProcessPoolExecutor=None) -> int:
     exit_code:int = 0
+
+    # Compute the results in the worker processes if present, preserving their order
+    worker_rets:iter = None
+    if perform_analysis and pool is not None:
+        iterate_keebs:bool = output_key == 'local-keeb-results'
+        worker_rets = pool.map(run_worker_iteration, repeat(analysis['func-name']), repeat(iterate_keebs), range(len(iter_layouts)), map(lambda l: layout_results(coverage_data['~results'], l), iter_layouts))
+
     for iter_layout in iter_layouts:
         ret:object = None
         if perform_analysis:
             try:
-                ret = func(aargs, coverage_data['~results'], iter_layout, const_layouts)
+                if worker_rets is None:
+                    ret = func(aargs, coverage_data['~results'], iter_layout, const_layouts)
+                else:
+                    (failure_message, ret) = next(worker_rets)
+                    if failure_message is not None:
+                        raise AnalysisFailedError(failure_message)
             except AnalysisFailedError as afe:
                 print(afe.message, file=stderr)
                 exit_code = analysis['exit-code']
+            if type(ret) == InstrumentedAnalysisResult:
+                coverage_data['~results']['layout_search_statistics'].setdefault(iter_layout[0], {})[analysis['func-name']] = ret.statistics.as_dict()
+                ret = ret.result
             if type(ret) == FailedAnalysisResult:
                 exit_code |= analysis['exit-code']
                 ret = ret.result
-        if aargs.analysis_verbosity >= analysis['verbosity']:
+        if is_selected(aargs, analysis):
             coverage_data[output_key][iter_layout[0]][analysis['pretty-name']] = ret
         coverage_data['~results'][analysis['func-name']][iter_layout[0]] = ret
     return exit_code
 
+##
+# @brief Restrict the results of previous analyses to those of a given layout, so that only these are sent to a worker process
+#
+# @param results:dict Results of previous analyses
+# @param layout:Tuple[str, List[int]] The layout of interest
+#
+# @return The results of the local analyses of the layout
+def layout_results(results:dict, layout:Tuple[str, List[int]]) -> dict:
+    return { k: { layout[0]: v[layout[0]] } for k,v in results.items() if type(v) == dict and layout[0] in v }
+
+worker_state:SimpleNamespace = None
+##
+# @brief Prepare a worker process, which keeps the layouts, their index and a memo of sub-counts for every layout it analyses. The memo budget is divided between the workers, so sub-counts are shared between the layouts analysed by the same process
+#
+# @param aargs:Namespace Analysis arguments, without a memo
+# @param keeb_layouts:[[dict]] The keyboards
+# @param kit_layouts:[[dict]] The kits
+# @param key_index:dict The index of the keys of the layouts, if built
+def init_worker(aargs:Namespace, keeb_layouts:[[dict]], kit_layouts:[[dict]], key_index:dict):
+    global worker_state
+    aargs.subcover_memo = LruMemo(aargs.memo_budget * 2 ** 20 / aargs.jobs) if aargs.memo_budget > 0 else None
+    worker_state = SimpleNamespace(aargs=aargs, keeb_layouts=keeb_layouts, kit_layouts=kit_layouts, key_index=key_index)
+
+def run_worker_iteration(func_name:str, iterate_keebs:bool, index:int, results:dict) -> Tuple[str, object]:
+    iter_layouts:[[dict]] = worker_state.keeb_layouts if iterate_keebs else worker_state.kit_layouts
+    const_layouts:[[dict]] = worker_state.kit_layouts if iterate_keebs else worker_state.keeb_layouts
+    results['key_index'] = worker_state.key_index
+    try:
+        return (None, getattr(analyses_mod, func_name)(worker_state.aargs, results, iter_layouts[index], const_layouts))
+    except AnalysisFailedError as afe:
+        return (afe.message, None)
+
 def handle_analysis_on_keys(aargs:Namespace, analysis:dict, func:Callable, coverage_data:dict, output_key:str, keys:[dict], const_layouts:[[dict]], perform_analysis:bool = True) -> int:
     exit_code:int = 0
     for key in keys:
@@ -118,13 +199,14 @@ def handle_analysis_on_keys(aargs:Namespace, analysis:dict, func:Callable, cover
             if type(ret) == FailedAnalysisResult:
                 exit_code |= analyis['exit-code']
                 ret = ret.result
-        if aargs.analysis_verbosity >= analysis['verbosity']:
+        if is_selected(aargs, analysis):
             coverage_data[output_key][key][analysis['pretty-name']] = ret
         coverage_data['~results'][analysis['func-name']][key] = ret
     return exit_code
 
 def sanitise(coverage_data:Union[dict, List[dict]]) -> dict:
-    de_primer:dict = coverage_data['~results']['de_primer']
+    key_table:[Key] = coverage_data['~results']['key_table']
+    coverage_data = plain_results(coverage_data)
 
     # Remove local data if no analyses are to be printed
     local_result_keys:[str] = ['local-keeb-results', 'local-kit-results', 'local-key-results']
@@ -139,7 +221,7 @@ def sanitise(coverage_data:Union[dict, List[dict]]) -> dict:
         pretty_key:Callable
         if local_result_key == 'local-key-results':
             pretty_local_result_key:str = 'Key'
-            pretty_key = lambda rk: de_primer[rk]['pretty-name']
+            pretty_key = lambda rk: key_table[rk].pretty_name
         else:
             pretty_local_result_key:str = 'Layout'
             pretty_key = lambda x: x
@@ -155,12 +237,32 @@ def sanitise(coverage_data:Union[dict, List[dict]]) -> dict:
 
     return renamed_coverage_data
 
+##
+# @brief Replace the values which not all output formats can show: the partially-known values of searches which ran out of time are replaced with their textual form, for example '≥ 12', layouts' arrays of key ids with lists and keys with dictionaries of their properties
+#
+# @param data:object Results which may contain bounds, arrays and keys
+#
+# @return The results with all bounds, arrays and keys replaced
+def plain_results(data:object) -> object:
+    if type(data) == Bound:
+        return str(data)
+    elif type(data) == array:
+        return data.tolist()
+    elif type(data) == Key:
+        return data.as_dict()
+    elif type(data) == dict:
+        return { k: plain_results(v) for k,v in data.items() }
+    elif type(data) in [list, tuple]:
+        return type(data)(map(plain_results, data))
+    return data
+
 def sanitise_analyses(analyses:[dict]) -> [dict]:
     defaults:dict = {
         'verbosity': lambda _: DEFAULT_VERBOSITY,
         'analysis-properties': lambda _: AnalysisTypes.GLOBAL,
         'pretty-name': lambda a: a['name'],
         'exit-code': lambda _: 1,
+        'always-run': lambda _: False,
         'func-name': lambda a: a['name'][1:] if a['name'].startswith('~') else a['name']
     }
     for analysis in analyses:
@@ -169,18 +271,104 @@ def sanitise_analyses(analyses:[dict]) -> [dict]:
                 analysis[default] = defaults[default](analysis)
     return analyses
 
-def linearise_analyses(analyses:[dict]) -> [dict]:
-    # Compute required-by
-    analyses.append({ 'name': 'SOURCE', 'requires': list(map(lambda a: a['name'], analyses)) })
+##
+# @brief Decide whether the results of an analysis are wanted in its own right, that is, whether they are output or whether it is always run (as its failure sets the exit code) when no analyses are selected
+#
+# @param aargs:Namespace Analysis arguments, which hold the selection, verbosity and output format
+# @param analysis:dict The analysis
+#
+# @return Whether the analysis must be performed
+def is_demanded(aargs:Namespace, analysis:dict) -> bool:
+    if analysis['always-run'] and not aargs.selected_analyses:
+        return True
+    visible:bool = aargs.output_format in ['json', 'yaml'] or aargs.output_format == 'text' and not analysis['pretty-name'].startswith('~')
+    return visible and is_selected(aargs, analysis)
+
+##
+# @brief Find the roles of the layouts on which an analysis is performed
+#
+# @param analysis:dict The analysis
+#
+# @return The roles, 'keebs' and 'kits', of the layouts on which the analysis is performed (none if it is global)
+def get_roles(analysis:dict) -> Set[str]:
+    props:int = analysis['analysis-properties']
+    roles:Set[str] = set()
+    if props & (AnalysisTypes.INDIVIDUAL_KEEBS | AnalysisTypes.ITERATE_KEEBS | AnalysisTypes.ITERATE_KEEB_KEYS):
+        roles.add('keebs')
+    if props & (AnalysisTypes.INDIVIDUAL_KITS | AnalysisTypes.ITERATE_KITS | AnalysisTypes.ITERATE_KIT_KEYS):
+        roles.add('kits')
+    return roles
+
+##
+# @brief Resolve the names of analyses given on the command line, where the '~' of private analyses may be omitted. Exits if an analysis does not exist
+#
+# @param analyses:[dict] All analyses
+# @param names:Union[str, List[str]] Comma-separated names, or a list of names
+#
+# @return The names of the analyses
+def get_analysis_names(analyses:[dict], names:Union[str, List[str]]) -> [str]:
+    if type(names) == str:
+        names = names.split(',')
+    known_names:Set[str] = set(map(lambda a: a['name'], analyses))
+    resolved_names:[str] = []
+    for name in filter(None, map(lambda n: n.strip(), names)):
+        if name not in known_names and '~' + name in known_names:
+            name = '~' + name
+        if name not in known_names:
+            print('Analysis "%s" was selected but does not exist, see --long-help for the names of analyses' % name, file=stderr)
+            exit(-1)
+        resolved_names.append(name)
+    return resolved_names
+
+##
+# @brief Plan the analyses to perform: those demanded along with everything they require, ordered so that each follows its requirements
+#
+# @param analyses:[dict] All analyses
+# @param demanded:Callable Whether an analysis is wanted in its own right
+# @param skipped:[str] Names of analyses not to perform, nor any analysis which requires them
+#
+# @return The analyses to perform in order, each with the roles of the layouts on which it is performed
+def linearise_analyses(analyses:[dict], demanded:Callable, skipped:[str]=[]) -> List[Tuple[dict, Set[str]]]:
     analyses_dict:dict = { a['name']: a for a in analyses }
+    for analysis in analyses:
+        if 'requires' in analysis:
+            for rname in analysis['requires']:
+                if rname not in analyses_dict:
+                    print('Analysis "%s" has non-existent dependency "%s"' % (analysis['name'], rname), file=stderr)
+                    exit(-1)
+
+    # Find the skipped analyses and those which require them
+    skipped_closure:Set[str] = set()
+    def _skip(aname:str):
+        if aname not in skipped_closure:
+            skipped_closure.add(aname)
+            for analysis in filter(lambda a: aname in a.get('requires', []), analyses):
+                _skip(analysis['name'])
+    for aname in skipped:
+        _skip(aname)
+
+    # Find the analyses required by those demanded, along with the roles of the layouts on which each is needed
+    required:Dict[str, Set[str]] = {}
+    def _require(aname:str, roles:Set[str]):
+        analysis:dict = analyses_dict[aname]
+        is_local:bool = analysis['analysis-properties'] & AnalysisTypes.LOCAL != 0
+        roles = roles & get_roles(analysis)
+        if aname in required and roles <= required[aname] or is_local and not roles:
+            return
+        required[aname] = required.get(aname, set()) | roles
+        for rname in analysis.get('requires', []):
+            _require(rname, roles if is_local else set(analysis.get('required-roles', get_roles(analyses_dict[rname]))))
+    for analysis in filter(lambda a: a['name'] not in skipped_closure and demanded(a), analyses):
+        _require(analysis['name'], get_roles(analysis))
+
+    # Compute required-by
+    analyses_dict = { a['name']: a for a in analyses if a['name'] in required }
+    analyses_dict['SOURCE'] = { 'name': 'SOURCE', 'requires': list(analyses_dict) }
     for aname in analyses_dict:
         analyses_dict[aname]['required-by'] = ['SOURCE']
     for aname in analyses_dict:
         if 'requires' in analyses_dict[aname]:
             for rname in analyses_dict[aname]['requires']:
-                if rname not in analyses_dict:
-                    print('Analysis "%s" has non-existent dependency "%s"' % (aname, rname), file=stderr)
-                    exit(-1)
                 analyses_dict[rname]['required-by'].append(aname)
 
     # Linearise along prerequisites (with a DFS)
@@ -198,4 +386,4 @@ def linearise_analyses(analyses:[dict]) -> [dict]:
                 linearised_analyses.append(rname)
     _linearise_analyses('SOURCE')
 
-    return map(lambda l: analyses_dict[l], linearised_analyses)
+    return map(lambda l: (analyses_dict[l], required[l]), linearised_analyses)
@@ -104,6 +104,7 @@ args:[dict] = [
             1,
             2,
             3,
+            4,
         ]
     },
     {
@@ -139,9 +140,146 @@ args:[dict] = [
         'short': '-q',
         'long': '--quick-coverage-analysis',
         'action': 'store_true',
-        'help': 'Speed up coverage analysis by making some states indistinguishable. Does not affect checking for the existence of a covering set but other analysis is weakened to only bounds. See the README.',
+        'help': 'Speed up coverage analysis by ignoring kits which could be added to an existing covering set. Does not affect checking for the existence of a covering set or finding the smallest ones but the number of covering sets is weakened to a lower bound. See the README.',
         'type': bool,
         'default': False,
+    },
+    {
+        'dest': 'minimal_covering_sets',
+        'short': '-m',
+        'long': '--minimal-covering-sets',
+        'action': 'store_true',
+        'help': 'Only consider covering sets from which no kit can be removed. Prunes any part of the search which would extend a covering set, which reduces time and memory when many kits overlap. See the README.',
+        'type': bool,
+        'default': False,
+    },
+    {
+        'dest': 'superset_covering_sets',
+        'short': '-S',
+        'long': '--superset-covering-sets',
+        'action': 'store_true',
+        'help': 'Also consider every covering set formed by adding kits to one found by the search, that is, every set of kits which covers a layout and only contains kits sharing some key with it. There can be exponentially many of these. Ignored with -q and -m. See the README.',
+        'type': bool,
+        'default': False,
+    },
+    {
+        'dest': 'max_covering_sets',
+        'short': '-M',
+        'long': '--max-covering-sets',
+        'action': 'store',
+        'help': 'Stop searching for the covering sets of a layout once this many have been found, 0 for no limit. The number of covering sets and the least-required kit then only consider those found',
+        'type': int,
+        'metavar': 'num',
+        'default': 0
+    },
+    {
+        'dest': 'best_covering_sets',
+        'short': '-k',
+        'long': '--best-covering-sets',
+        'action': 'store',
+        'help': 'The number of least-surplus and smallest covering sets to list for each keyboard, best first. 0 to disable',
+        'type': int,
+        'metavar': 'num',
+        'default': 5
+    },
+    {
+        'dest': 'jobs',
+        'short': '-j',
+        'long': '--jobs',
+        'action': 'store',
+        'help': 'Analyse the coverage of this many layouts at once, each in a separate process',
+        'type': int,
+        'metavar': 'num',
+        'default': 1
+    },
+    {
+        'dest': 'memo_budget',
+        'short': '-b',
+        'long': '--memo-budget',
+        'action': 'store',
+        'help': 'Memory in MiB for results shared between the coverage analyses of different layouts when counting with -S, the least-recently-used are dropped first. With --jobs, this is divided between the worker processes, each of which shares results between the layouts it analyses. 0 to disable',
+        'type': int,
+        'metavar': 'MiB',
+        'default': 64
+    },
+    {
+        'dest': 'state_budget',
+        'short': '-s',
+        'long': '--state-budget',
+        'action': 'store',
+        'help': 'Memory in MiB for the states remembered by each coverage search, the least-recently-used are dropped first (quick analysis uses a Bloom filter which is cleared when full). 0 to disable',
+        'type': int,
+        'metavar': 'MiB',
+        'default': 64
+    },
+    {
+        'dest': 'time_budget',
+        'short': '-T',
+        'long': '--time-budget',
+        'action': 'store',
+        'help': 'Seconds which may be spent searching for the covering sets of each layout, after which the best results so far are output as bounds. 0 for no limit',
+        'type': float,
+        'metavar': 'secs',
+        'default': 0.0
+    },
+    {
+        'dest': 'total_time_budget',
+        'short': '-G',
+        'long': '--total-time-budget',
+        'action': 'store',
+        'help': 'Seconds which may be spent running all analyses, after which the remaining searches output the best results so far as bounds. 0 for no limit',
+        'type': float,
+        'metavar': 'secs',
+        'default': 0.0
+    },
+    {
+        'dest': 'only_analyses',
+        'short': '-o',
+        'long': '--only',
+        'action': 'store',
+        'help': 'Comma-separated names of the analyses to output regardless of verbosity, only these and those they require are performed (names are listed by --long-help)',
+        'type': str,
+        'metavar': 'names',
+        'default': ''
+    },
+    {
+        'dest': 'skip_analyses',
+        'short': '-x',
+        'long': '--skip',
+        'action': 'store',
+        'help': 'Comma-separated names of analyses not to perform, nor any which require them',
+        'type': str,
+        'metavar': 'names',
+        'default': ''
+    },
+    {
+        'dest': 'no_cache',
+        'short': '-n',
+        'long': '--no-cache',
+        'action': 'store_true',
+        'help': 'Parse every layout file rather than reusing the layouts parsed by previous runs',
+        'type': bool,
+        'default': False
+    },
+    {
+        'dest': 'cache_dir',
+        'short': '-D',
+        'long': '--cache-dir',
+        'action': 'store',
+        'help': 'Private directory in which to keep parsed layouts for later runs, if empty $XDG_CACHE_HOME/keycov or ~/.cache/keycov',
+        'type': str,
+        'metavar': 'dir',
+        'default': ''
+    },
+    {
+        'dest': 'cache_budget',
+        'short': '-B',
+        'long': '--cache-budget',
+        'action': 'store',
+        'help': 'Size in MiB of the directory of parsed layouts, beyond which the least-recently-used are removed',
+        'type': int,
+        'metavar': 'MiB',
+        'default': 256
     }
 ]
 arg_dict:dict = { a['dest']: a for a in args if 'dest' in a }
@@ -252,7 +390,7 @@ def arg_inf(arg:dict) -> str:
 def get_long_help() -> str:
     table:BeautifulTable = BeautifulTable()
     #  Add the data
-    for r in list(map(lambda a: [a['pretty-name'], a['description'] + ' (verbosity-level: %d)' %(a['verbosity'] if 'verbosity' in a else DEFAULT_VERBOSITY)], filter(lambda a: 'pretty-name' in a and not a['name'].startswith('~'), analyses))):
+    for r in list(map(lambda a: [a['pretty-name'], a['description'] + ' (name: %s, verbosity-level: %d)' %(a['name'], a['verbosity'] if 'verbosity' in a else DEFAULT_VERBOSITY)], filter(lambda a: 'pretty-name' in a and not a['name'].startswith('~'), analyses))):
         table.rows.append(r)
 
     # Apply styling
@@ -1,53 +1,450 @@
-from .util import fst, iconcat, mult, snd
-from copy import copy
-from functools import reduce
-from re import match
-from typing import List, Set, Tuple
-
-def get_covering_sets(approximate_analysis:bool, to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]]) -> List[Tuple[str, List[int]]]:
-    # Represent each layout as the product of the primes which represent its keys
-    primed_to_cover = (to_cover[0], reduce(mult, to_cover[1], 1))
-    primed_sets = list(map(lambda s: (s[0], 1, reduce(mult, s[1], 1)), sets))
-
-    # Set of: remainders and set of currently chosen keysets (as a number)
-    seen:Set[Tuple[int, int]] = set()
-    ##
-    # @brief Perform a depth-first search on the set to cover,k
-    #
-    # @param r:int                  Uncovered remainder
-    # @param cp:int                 Current path number
-    # @param csp:int                Covering-set number
-    # @param csns:[str]             Covering-set member names
-    # @param psets:List[Tuple[str   Primed candidate sets
-    #
-    # @return
-    def primes_dfs(r:int, cp:int, csp:int, csns:[str], psets:List[Tuple[str, int, int]]) -> [[str]]:
-        seen.add((r, cp) if not approximate_analysis else csp)
-        if r == 1:
-            return [csns]
-        elif psets == []:
-            return []
-
-        child_covering_sets:[str] = []
-        for n,p,kn in psets:
-            r2:int = r // gcd(r, kn)
-            cp2:int = cp * p
-            csp2:int = csp * kn
-            # Explore beneficial unexplored children
-            if r != r2 \
-                    and (not approximate_analysis or csp2 not in seen) \
-                    and (approximate_analysis or (r2, cp2) not in seen):
-                psets2:List[Tuple[str, int, int]] = copy(psets)
-                psets2.remove((n,p,kn))
-                child_covering_sets.extend(primes_dfs(r2, cp2, csp2, csns + [n], psets2))
-        return child_covering_sets
-
-    # Perform dfs over covering sets
-    covering_sets:[str] = primes_dfs(primed_to_cover[1], 1, 1, [], primed_sets)
-
-    # Reunite set names with their contents
-    set_dict:dict = dict(sets)
-    return list(map(lambda c: list(map(lambda s: (s, set_dict[s]), c)), sorted(covering_sets)))
+from .dancing_links import CoverMatrix, search_covers, search_optimal_cover
+from .memo import BloomFilter, LruMemo
+from .search_statistics import SearchStatistics
+from .util import fst, lazy_product, powerset, snd
+from functools import partial
+from heapq import heappop, heappush
+from itertools import chain, combinations, product
+from math import comb, prod
+from typing import Iterator, List, Set, Tuple, Union
+
+# Memory in bytes for the states remembered by each search unless otherwise specified
+default_state_budget:float = 64 * 2 ** 20
+
+##
+# @brief Lazily enumerate the sets of kits which cover a layout
+#
+# The covering sets of the layout are the combinations of a covering set of each of its independent components. These are formed lazily, and each component is searched once: the covering sets of all but the first are kept as they are found, to be combined with each later covering set of the components before them.
+#
+# @param approximate_analysis:bool Whether to omit covering sets formed by adding kits to another covering set
+# @param to_cover:Tuple[str, List[int]] The layout to cover
+# @param sets:Set[Tuple[str, List[int]]] The candidate layouts to cover it with
+# @param minimal_only:bool Whether to only yield inclusion-minimal covering sets
+# @param supersets:bool Whether to also yield every covering set formed by adding kits to one found by the search, unless performing approximate or minimal-only analysis
+# @param stats:SearchStatistics Counters to update and the deadline by which to stop, if any
+# @param state_budget:float Memory in bytes for the states remembered by each search
+#
+# @return An iterator of covering sets, in the order in which they are found, which ends early if the deadline passes
+def get_covering_sets(approximate_analysis:bool, to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]], minimal_only:bool=False, supersets:bool=False, stats:SearchStatistics=None, state_budget:float=default_state_budget) -> Iterator[List[Tuple[str, List[int]]]]:
+    # Only the covering sets of the first component are not kept, so this is the one with the most kits
+    components:List[Tuple[Tuple[str, List[int]], List[Tuple[str, List[int]]]]] = sorted(get_coverage_components(to_cover, sets), key=lambda c: -len(c[1]))
+    component_covering_sets:List[Iterator[List[Tuple[str, List[int]]]]] = list(map(lambda c: get_component_covering_sets(approximate_analysis, c[0], c[1], minimal_only, supersets, stats, state_budget), components))
+
+    set_order:dict = { s[0]: i for i,s in enumerate(sets) }
+    for covering_set in lazy_product(component_covering_sets):
+        # Many covering sets may be formed from each cover found by the searches, so the deadline is also checked here
+        if stats is not None and stats.out_of_time():
+            return
+        yield sorted(covering_set, key=lambda s: set_order[s[0]])
+
+def get_component_covering_sets(approximate_analysis:bool, to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]], minimal_only:bool, supersets:bool, stats:SearchStatistics, state_budget:float) -> Iterator[List[Tuple[str, List[int]]]]:
+    # Represent each layout as a vector of key-counts over dense key ids
+    key_ids:dict = dense_key_ids([to_cover[1]])
+    vector_to_cover:Tuple[int] = count_vector(key_ids, to_cover[1])
+
+    # Search over classes of interchangeable kits rather than the kits themselves
+    kit_classes:List[Tuple[List[Tuple[int, int]], List[int]]] = get_kit_classes(key_ids, sets)[0]
+    matrix:CoverMatrix = CoverMatrix(vector_to_cover, list(map(fst, kit_classes)))
+    copies:[int] = list(map(lambda c: len(c[1]), kit_classes))
+
+    # Expand each cover into the kits of its classes, adding any superset of a covering set only if these are asked for
+    for chosen,optional in search_covers(matrix, minimal_only, copies, approximate_analysis, stats, make_dead_states(approximate_analysis, state_budget)):
+        chosen_classes:List[Tuple[int, int]] = list(key_counts(chosen).items())
+        optional_sets:[int] = list(chain.from_iterable(map(lambda r: kit_classes[r][1], optional)))
+        for choice in product(*map(lambda p: combinations(kit_classes[p[0]][1], p[1]), chosen_classes)):
+            extensions:Iterator[Tuple[int]] = powerset(optional_sets) if supersets and not approximate_analysis and not minimal_only else iter([()])
+            for extension in extensions:
+                yield list(map(lambda i: sets[i], sorted(chain(chain.from_iterable(choice), extension))))
+
+##
+# @brief Count the covering sets which get_covering_sets would return that contain each kit, without forming the covering sets of the whole layout
+#
+# Each kit is a candidate in a single component, so it is in as many covering sets of the layout as it is in covering sets of its component, times the number of covering sets of each other component. Only the covering sets of each component are enumerated, once.
+#
+# @param approximate_analysis:bool Whether to omit covering sets formed by adding kits to another covering set
+# @param to_cover:Tuple[str, List[int]] The layout to cover
+# @param sets:Set[Tuple[str, List[int]]] The candidate layouts to cover it with
+# @param minimal_only:bool Whether to only count inclusion-minimal covering sets
+# @param supersets:bool Whether to also count the covering sets formed by adding kits to one found by the search
+# @param stats:SearchStatistics Counters to update and the deadline by which to stop, if any
+# @param state_budget:float Memory in bytes for the states remembered by each search
+#
+# @return The number of covering sets which contain each kit in any, by name, or lower bounds on these if the deadline passes
+def get_kit_usage(approximate_analysis:bool, to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]], minimal_only:bool=False, supersets:bool=False, stats:SearchStatistics=None, state_budget:float=default_state_budget) -> dict:
+    component_usages:List[Tuple[int, dict]] = []
+    for component in get_coverage_components(to_cover, sets):
+        num_covering_sets:int = 0
+        usage:dict = {}
+        for covering_set in get_component_covering_sets(approximate_analysis, component[0], component[1], minimal_only, supersets, stats, state_budget):
+            num_covering_sets += 1
+            for kit,_ in covering_set:
+                usage[kit] = usage.get(kit, 0) + 1
+        if num_covering_sets == 0:
+            return {}
+        component_usages.append((num_covering_sets, usage))
+
+    num_covering_sets:int = prod(map(fst, component_usages))
+    return dict(chain.from_iterable(map(lambda c: map(lambda p: (p[0], p[1] * (num_covering_sets // c[0])), c[1].items()), component_usages)))
+
+##
+# @brief Count the covering sets which get_covering_sets would return, without enumerating them
+#
+# This is the product of the numbers of covering sets of the independent components of the layout. When supersets are counted in the exact case, this is a dynamic programme over the kits in order, where the number of covering sets of a remainder r using some kits is the number which skip the first kit plus the number which use it. Kits which share no key with r can be added freely to any of these, so each subproblem is reduced to the kits which share a key with r before it is looked up. Sub-counts are memoised on the keys of r and the names of these kits, so that keyboards which share parts of their layouts also share sub-counts when the same memo is passed. Otherwise, the covers found by the search are counted without storing them, each standing for every way of choosing its kits from their classes.
+#
+# @param approximate_analysis:bool Whether to count as in approximate analysis
+# @param to_cover:Tuple[str, List[int]] The layout to cover
+# @param sets:Set[Tuple[str, List[int]]] The candidate layouts to cover it with
+# @param minimal_only:bool Whether to count only inclusion-minimal covering sets
+# @param supersets:bool Whether to also count the covering sets formed by adding kits to one found by the search
+# @param memo:LruMemo Sub-counts shared between calls, if any
+# @param stats:SearchStatistics Counters to update and the deadline by which to stop, if any
+# @param state_budget:float Memory in bytes for the states remembered by each search, and for the sub-counts if none are shared
+#
+# @return The number of covering sets, or a lower bound on it if the deadline passes
+def count_covering_sets(approximate_analysis:bool, to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]], minimal_only:bool=False, supersets:bool=False, memo:LruMemo=None, stats:SearchStatistics=None, state_budget:float=default_state_budget) -> int:
+    num_covering_sets:int = 1
+    for component in get_coverage_components(to_cover, sets):
+        num_covering_sets *= count_component_covering_sets(approximate_analysis, component[0], component[1], minimal_only, supersets, memo, stats, state_budget)
+        if num_covering_sets == 0:
+            break
+    return num_covering_sets
+
+def count_component_covering_sets(approximate_analysis:bool, to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]], minimal_only:bool, supersets:bool, memo:LruMemo, stats:SearchStatistics, state_budget:float) -> int:
+    if not supersets or approximate_analysis or minimal_only:
+        key_ids:dict = dense_key_ids([to_cover[1]])
+        vector_to_cover:Tuple[int] = count_vector(key_ids, to_cover[1])
+        kit_classes:List[Tuple[List[Tuple[int, int]], List[int]]] = get_kit_classes(key_ids, sets)[0]
+        class_sizes:[int] = list(map(lambda c: len(c[1]), kit_classes))
+        covers:Iterator[Tuple[List[int], List[int]]] = search_covers(CoverMatrix(vector_to_cover, list(map(fst, kit_classes))), minimal_only, class_sizes, approximate_analysis, stats, make_dead_states(approximate_analysis, state_budget))
+        return sum(map(lambda cover: prod(map(lambda p: comb(class_sizes[p[0]], p[1]), key_counts(cover[0]).items())), covers))
+
+    subcounts:LruMemo = memo if memo is not None else LruMemo(state_budget)
+    set_names:[str] = list(map(fst, sets))
+    set_counts:[dict] = list(map(lambda s: key_counts(s[1]), sets))
+
+    # A subproblem is a multiplier for the kits which can be freely added, a memo key, a remainder and the kits which share a key with it
+    def relevant_subproblem(r:Tuple[Tuple[int, int]], candidates:Tuple[int]) -> Tuple[int, tuple, Tuple[Tuple[int, int]], Tuple[int]]:
+        relevant_candidates:Tuple[int] = tuple(filter(lambda i: any(map(lambda p: p[0] in set_counts[i], r)), candidates))
+        return (2 ** (len(candidates) - len(relevant_candidates)), ('count', r, tuple(map(lambda i: set_names[i], relevant_candidates))), r, relevant_candidates)
+
+    # Each frame holds a subproblem, the subproblems whose counts it sums and the sum so far
+    def new_frame(subproblem:Tuple[int, tuple, Tuple[Tuple[int, int]], Tuple[int]]) -> list:
+        r:Tuple[Tuple[int, int]] = subproblem[2]
+        candidates:Tuple[int] = subproblem[3]
+        if r == ():
+            return [subproblem, [], 1]
+        elif any(map(lambda p: sum(map(lambda i: set_counts[i].get(p[0], 0), candidates)) < p[1], r)):
+            return [subproblem, [], 0]
+        first:int = candidates[0]
+        r2:Tuple[Tuple[int, int]] = tuple(filter(lambda p: p[1] > 0, map(lambda p: (p[0], p[1] - set_counts[first].get(p[0], 0)), r)))
+        return [subproblem, [relevant_subproblem(r, candidates[1:]), relevant_subproblem(r2, candidates[1:])], 0]
+
+    # Only kits which share a key with the layout are candidates at all
+    to_cover_counts:Tuple[Tuple[int, int]] = tuple(sorted(key_counts(to_cover[1]).items()))
+    root:Tuple[int, tuple, Tuple[Tuple[int, int]], Tuple[int]] = relevant_subproblem(to_cover_counts, tuple(filter(lambda i: any(map(lambda p: p[0] in set_counts[i], to_cover_counts)), range(len(sets)))))
+
+    # Evaluate the subproblems with an explicit stack, keeping the counts of pending subproblems in their frames as the memo may evict them
+    hits_before:int = subcounts.hits
+    num_covering_sets:int = subcounts.get(root[1])
+    stack:List[list] = [new_frame(root)] if num_covering_sets is None else []
+    while stack != []:
+        if stats is not None:
+            if stats.out_of_time():
+                break
+            stats.nodes_expanded += 1
+            stats.observe_stack_depth(len(stack))
+        frame:list = stack[-1]
+        if frame[1] != []:
+            subproblem:Tuple[int, tuple, Tuple[Tuple[int, int]], Tuple[int]] = frame[1].pop()
+            subcount:int = subcounts.get(subproblem[1])
+            if subcount is None:
+                stack.append(new_frame(subproblem))
+            else:
+                frame[2] += subproblem[0] * subcount
+            continue
+        stack.pop()
+        subcounts[frame[0][1]] = frame[2]
+        if stats is not None:
+            stats.observe_memo_size(len(subcounts))
+        if stack != []:
+            stack[-1][2] += frame[0][0] * frame[2]
+        else:
+            num_covering_sets = frame[2]
+
+    # If stopped early, the subproblems not yet counted could only add to the count so far
+    while stack != []:
+        frame:list = stack.pop()
+        if stack != []:
+            stack[-1][2] += frame[0][0] * frame[2]
+        else:
+            num_covering_sets = frame[2]
+
+    if stats is not None:
+        stats.memo_hits += subcounts.hits - hits_before
+    return root[0] * num_covering_sets
+
+def get_covering_set_of_lowest_units(to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]], unit_costs:dict, stats:SearchStatistics=None) -> Tuple[float, List[Tuple[str, List[int]]]]:
+    return get_optimal_covering_set(to_cover, sets, unit_costs, True, stats)
+
+def get_covering_set_of_lowest_cardinality(to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]], unit_costs:dict, stats:SearchStatistics=None) -> Tuple[int, List[Tuple[str, List[int]]]]:
+    return get_optimal_covering_set(to_cover, sets, unit_costs, False, stats)
+
+##
+# @brief Find a covering set which minimises either its total units or its number of kits, without enumerating covering sets
+#
+# The optimal covering set of the layout is the union of those of its independent components. Within each component, ties in total units are broken by the number of kits and vice versa, remaining ties are broken by the kit names.
+#
+# @param to_cover:Tuple[str, List[int]] The layout to cover
+# @param sets:Set[Tuple[str, List[int]]] The candidate layouts to cover it with
+# @param unit_costs:dict The units of each key by id under 'keys' and of each layout by name under 'layouts'
+# @param by_units:bool Minimise total units if true, otherwise minimise the number of kits
+# @param stats:SearchStatistics Counters to update and the deadline by which to stop, if any
+#
+# @return A pair of the minimised quantity and the covering set, or None if there is no covering set. If the deadline passes, the best found so far is returned, or None if some part of the layout is yet to be covered
+def get_optimal_covering_set(to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]], unit_costs:dict, by_units:bool, stats:SearchStatistics=None) -> Tuple[float, List[Tuple[str, List[int]]]]:
+    optimum:float = 0
+    covering_set:List[Tuple[str, List[int]]] = []
+    for component in get_coverage_components(to_cover, sets):
+        component_optimum:Tuple[float, List[Tuple[str, List[int]]]] = get_component_optimal_covering_set(component[0], component[1], unit_costs, by_units, stats)
+        if component_optimum is None:
+            return None
+        optimum += component_optimum[0]
+        covering_set += component_optimum[1]
+
+    set_order:dict = { s[0]: i for i,s in enumerate(sets) }
+    return (optimum, sorted(covering_set, key=lambda s: set_order[s[0]]))
+
+##
+# @brief Find the units of a layout, from the table of unit costs unless it is not a layout which was analysed
+#
+# @param unit_costs:dict The units of each key by id under 'keys' and of each layout by name under 'layouts'
+# @param layout:Tuple[str, List[int]] The layout
+#
+# @return The total units of the keys of the layout
+def get_set_units(unit_costs:dict, layout:Tuple[str, List[int]]) -> float:
+    units:float = unit_costs['layouts'].get(layout[0])
+    return units if units is not None else sum(map(unit_costs['keys'].__getitem__, layout[1]))
+
+def get_component_optimal_covering_set(to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]], unit_costs:dict, by_units:bool, stats:SearchStatistics) -> Tuple[float, List[Tuple[str, List[int]]]]:
+    key_ids:dict = dense_key_ids([to_cover[1]])
+    vector_to_cover:Tuple[int] = count_vector(key_ids, to_cover[1])
+    candidate_sets:List[Tuple[str, List[int]]] = list(filter(lambda s: any(map(lambda k: k in key_ids, s[1])), sets))
+    matrix:CoverMatrix = CoverMatrix(vector_to_cover, list(map(lambda s: sparse_count_vector(key_ids, s[1]), candidate_sets)))
+
+    # Cost each kit by its units and by its being one kit
+    set_units:[float] = list(map(partial(get_set_units, unit_costs), candidate_sets))
+    row_costs:List[Tuple[float, float]]
+    column_weights:[float]
+    if by_units:
+        row_costs = list(map(lambda u: (u, 1), set_units))
+        column_weights = list(map(unit_costs['keys'].__getitem__, key_ids))
+    else:
+        row_costs = list(map(lambda u: (1, u), set_units))
+        column_weights = [1.0] * len(key_ids)
+
+    # A kit is dominated by any kit of its class or a dominating class which costs strictly less
+    kit_classes:List[Tuple[List[Tuple[int, int]], List[int]]]
+    class_dominators:List[List[int]]
+    kit_classes,class_dominators = get_kit_classes(key_ids, candidate_sets)
+    dominators:List[List[int]] = [ [] for _ in candidate_sets ]
+    for c,kit_class in enumerate(kit_classes):
+        for r in kit_class[1]:
+            dominators[r] = list(filter(lambda d: row_costs[d] < row_costs[r], chain(kit_class[1], chain.from_iterable(map(lambda d: kit_classes[d][1], class_dominators[c])))))
+
+    rows:[int] = search_optimal_cover(matrix, row_costs, column_weights, lambda rs: list(map(lambda r: candidate_sets[r][0], rs)), dominators, stats)
+    if rows is None:
+        return None
+    covering_set:List[Tuple[str, List[int]]] = list(map(lambda r: candidate_sets[r], rows))
+    return (sum(map(lambda r: row_costs[r][0], rows)), covering_set)
+
+##
+# @brief Lazily enumerate covering sets in order of increasing cost, by best-first search
+#
+# Sets of kits are arranged in a tree, where the children of a set are formed by adding one kit which comes after all of its kits, so every set is reached once. Sets are expanded in order of a lower bound on the cost of any covering set beneath them: the cost of the set plus the cheapest fractional cover of its remaining keys by the kits which may still be added. A covering set is yielded when it is reached in this order, as every covering set not yet found must then cost at least as much. Covering sets of equal cost are yielded in order of their kit names.
+#
+# @param to_cover:Tuple[str, List[int]] The layout to cover
+# @param sets:Set[Tuple[str, List[int]]] The candidate layouts to cover it with
+# @param unit_costs:dict The units of each key by id under 'keys' and of each layout by name under 'layouts'
+# @param by_units:bool Order by total units then the number of kits if true, otherwise the other way around
+# @param minimal_only:bool Whether to only yield inclusion-minimal covering sets
+# @param stats:SearchStatistics Counters to update and the deadline by which to stop, if any
+#
+# @return An iterator of pairs of the cost of a covering set, as its total units or number of kits, and the covering set, which ends early if the deadline passes
+def get_best_covering_sets(to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]], unit_costs:dict, by_units:bool, minimal_only:bool=False, stats:SearchStatistics=None) -> Iterator[Tuple[float, List[Tuple[str, List[int]]]]]:
+    key_ids:dict = dense_key_ids([to_cover[1]])
+    vector_to_cover:Tuple[int] = count_vector(key_ids, to_cover[1])
+    candidate_sets:List[Tuple[str, List[int]]] = list(filter(lambda s: any(map(lambda k: k in key_ids, s[1])), sets))
+    set_vectors:List[List[Tuple[int, int]]] = list(map(lambda s: sparse_count_vector(key_ids, s[1]), candidate_sets))
+    num_sets:int = len(candidate_sets)
+
+    # Cost each kit by its units and by its being one kit
+    set_units:[float] = list(map(partial(get_set_units, unit_costs), candidate_sets))
+    set_costs:List[Tuple[float, float]] = list(map(lambda u: (u, 1) if by_units else (1, u), set_units))
+    key_weights:[float] = list(map(unit_costs['keys'].__getitem__, key_ids)) if by_units else [1.0] * len(key_ids)
+
+    # The number of copies of each key in the kits from each position onwards
+    suffix_supplies:List[List[int]] = [[0] * len(key_ids)]
+    for v in reversed(set_vectors):
+        supply:List[int] = list(suffix_supplies[0])
+        for k,n in v:
+            supply[k] += n
+        suffix_supplies.insert(0, supply)
+
+    def useful_weight(i:int, remainder:Tuple[int]) -> float:
+        return sum(map(lambda p: min(p[1], remainder[p[0]]) * key_weights[p[0]], set_vectors[i]))
+
+    def lower_bound(remainder:Tuple[int], first:int) -> float:
+        if any(map(lambda k: suffix_supplies[first][k] < remainder[k], range(len(remainder)))):
+            return None
+        remaining_weight:float = sum(map(lambda k: remainder[k] * key_weights[k], range(len(remainder))))
+        if remaining_weight == 0:
+            return 0.0
+        return remaining_weight / max(map(lambda i: useful_weight(i, remainder) / set_costs[i][0], range(first, num_sets)))
+
+    def redundant(chosen:Tuple[int], i:int) -> bool:
+        supply:dict = {}
+        for j in chosen:
+            if j != i:
+                for k,n in set_vectors[j]:
+                    supply[k] = supply.get(k, 0) + n
+        return all(map(lambda p: supply.get(p[0], 0) >= vector_to_cover[p[0]], set_vectors[i]))
+
+    # Queue entries are ordered by their bounds, then sets to expand before covering sets, then by names
+    queue:List[tuple] = []
+    num_queued:int = 0
+    def enqueue(chosen:Tuple[int], remainder:Tuple[int], primary:float, secondary:float):
+        nonlocal num_queued
+        bound:float = lower_bound(remainder, chosen[-1] + 1 if chosen != () else 0)
+        if bound is None:
+            if stats is not None:
+                stats.branches_pruned += 1
+            return
+        if bound == 0.0:
+            heappush(queue, (primary, secondary, 1, list(map(lambda i: candidate_sets[i][0], chosen)), chosen, remainder))
+        else:
+            heappush(queue, (primary + bound, secondary, 0, num_queued, chosen, remainder))
+        num_queued += 1
+
+    enqueue((), vector_to_cover, 0.0, 0.0)
+    while queue != [] and (stats is None or not stats.out_of_time()):
+        (primary, secondary, covered, _, chosen, remainder) = heappop(queue)
+        if stats is not None:
+            stats.nodes_expanded += 1
+            stats.observe_stack_depth(len(queue))
+        if covered:
+            if not minimal_only or not any(map(lambda i: redundant(chosen, i), chosen)):
+                yield (primary, list(map(lambda i: candidate_sets[i], chosen)))
+            # Any superset of a covering set is not minimal
+            if minimal_only:
+                continue
+
+        chosen_primary:float = sum(map(lambda i: set_costs[i][0], chosen))
+        for i in range(chosen[-1] + 1 if chosen != () else 0, num_sets):
+            # A kit which supplies nothing still needed would be redundant
+            if minimal_only and useful_weight(i, remainder) == 0:
+                continue
+            child_remainder:List[int] = list(remainder)
+            for k,n in set_vectors[i]:
+                child_remainder[k] = max(0, child_remainder[k] - n)
+            enqueue(chosen + (i,), tuple(child_remainder), chosen_primary + set_costs[i][0], secondary + set_costs[i][1])
+
+##
+# @brief Make the table of states from which a search found no cover. Approximate analysis trades exactness for space with a Bloom filter, which may occasionally prune a branch which has covers
+#
+# @param approximate_analysis:bool Whether the search is for approximate analysis
+# @param state_budget:float Memory in bytes for the table
+#
+# @return The table, or None if no memory is given for it
+def make_dead_states(approximate_analysis:bool, state_budget:float) -> Union[BloomFilter, LruMemo]:
+    if state_budget <= 0:
+        return None
+    return BloomFilter(state_budget) if approximate_analysis else LruMemo(state_budget)
+
+##
+# @brief Split the problem of covering a layout into independent parts
+#
+# Consider the graph whose vertices are the keys of the layout and whose edges join the keys which share some kit. Each connected component of this graph, together with the kits which contain its keys, can be covered independently of the others. Kits which share no key with the layout are dropped.
+#
+# @param to_cover:Tuple[str, List[int]] The layout to cover
+# @param sets:Set[Tuple[str, List[int]]] The candidate layouts to cover it with
+#
+# @return A list of pairs of the part of the layout in a component and the kits which can cover it, ordered by first key
+def get_coverage_components(to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]]) -> List[Tuple[Tuple[str, List[int]], List[Tuple[str, List[int]]]]]:
+    parents:dict = { key: key for key in to_cover[1] }
+    def find(key:int) -> int:
+        while parents[key] != key:
+            parents[key] = parents[parents[key]]
+            key = parents[key]
+        return key
+
+    candidate_sets:List[Tuple[str, List[int]]] = []
+    for s in sets:
+        shared_keys:[int] = list(filter(lambda k: k in parents, s[1]))
+        if shared_keys != []:
+            candidate_sets.append(s)
+            for key in shared_keys[1:]:
+                parents[find(key)] = find(shared_keys[0])
+
+    components:dict = {}
+    for key in to_cover[1]:
+        components.setdefault(find(key), ([], []))[0].append(key)
+    for s in candidate_sets:
+        components[find(next(filter(lambda k: k in parents, s[1])))][1].append(s)
+    return list(map(lambda c: ((to_cover[0], c[0]), c[1]), components.values()))
+
+##
+# @brief Group kits which are interchangeable when covering a layout, and find which groups can stand in for others
+#
+# Kits are interchangeable if they have the same multiset of keys once restricted to those of the layout, such as colourway variants of a kit. One class dominates another if it has at least as many copies of every key. Kits which share no key with the layout are dropped.
+#
+# @param key_ids:dict The dense ids of the keys of the layout
+# @param sets:Set[Tuple[str, List[int]]] The candidate layouts to cover it with
+#
+# @return A pair of the classes, as pairs of their restricted sparse count vector and the indices of their kits, and the indices of the classes which dominate each class
+def get_kit_classes(key_ids:dict, sets:Set[Tuple[str, List[int]]]) -> Tuple[List[Tuple[List[Tuple[int, int]], List[int]]], List[List[int]]]:
+    class_ids:dict = {}
+    kit_classes:List[Tuple[List[Tuple[int, int]], List[int]]] = []
+    for i,s in enumerate(sets):
+        vector:Tuple[Tuple[int, int]] = tuple(sparse_count_vector(key_ids, s[1]))
+        if vector != ():
+            if vector not in class_ids:
+                class_ids[vector] = len(kit_classes)
+                kit_classes.append((list(vector), []))
+            kit_classes[class_ids[vector]][1].append(i)
+
+    def dominates(a:List[Tuple[int, int]], b:List[Tuple[int, int]]) -> bool:
+        a_counts:dict = dict(a)
+        return all(map(lambda p: a_counts.get(p[0], 0) >= p[1], b))
+    class_dominators:List[List[int]] = list(map(lambda c: list(filter(lambda d: d != c and dominates(kit_classes[d][0], kit_classes[c][0]), range(len(kit_classes)))), range(len(kit_classes))))
+
+    return (kit_classes, class_dominators)
+
+def key_counts(keys:List[int]) -> dict:
+    counts:dict = {}
+    for key in keys:
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+def dense_key_ids(layouts:iter) -> dict:
+    key_ids:dict = {}
+    for layout in layouts:
+        for key in layout:
+            if key not in key_ids:
+                key_ids[key] = len(key_ids)
+    return key_ids
+
+def count_vector(key_ids:dict, keys:List[int]) -> Tuple[int]:
+    counts:[int] = [0] * len(key_ids)
+    for key in keys:
+        counts[key_ids[key]] += 1
+    return tuple(counts)
+
+def sparse_count_vector(key_ids:dict, keys:List[int]) -> List[Tuple[int, int]]:
+    counts:dict = {}
+    for key in keys:
+        if key in key_ids:
+            counts[key_ids[key]] = counts.get(key_ids[key], 0) + 1
+    return sorted(counts.items())
 
 def get_uncovered(to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]]) -> List[Tuple[str, List[dict]]]:
     keys_to_cover:[int] = to_cover[1]
@@ -62,7 +459,18 @@ def get_uncovered(to_cover:Tuple[str, List[int]], sets:Set[Tuple[str, List[int]]
 
     return list(map(fst, sorted(filter(lambda p: p[1] > 0, uncovered.items()), key=snd)))
 
-def gcd(a:int, b:int) -> int:
-    while b != 0:
-        (a, b) = (b, a % b)
-    return a
+##
+# @brief Find the keys of a layout which occur more often in it than in some other layouts altogether
+#
+# @param to_cover:Tuple[str, List[int]] The layout to cover
+# @param totals:dict The number of occurrences of each key in the other layouts altogether
+#
+# @return The uncovered keys, as get_uncovered
+def get_uncovered_from_totals(to_cover:Tuple[str, List[int]], totals:dict) -> List[int]:
+    uncovered:dict = {}
+    for key in to_cover[1]:
+        uncovered[key] = uncovered.get(key, 0) + 1
+    for key in uncovered:
+        uncovered[key] -= totals.get(key, 0)
+
+    return list(map(fst, sorted(filter(lambda p: p[1] > 0, uncovered.items()), key=snd)))
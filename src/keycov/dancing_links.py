@@ -0,0 +1,340 @@
+from .search_statistics import SearchStatistics
+from typing import Callable, Iterator, List, Tuple
+
+##
+# @brief Sparse multiset-cover matrix with dancing-links style undo
+#
+# Columns are the keys which remain to be covered, each with a demand (the number of copies of that key still required). Rows are candidate kits, each holding a node per distinct key with the number of copies of that key the kit supplies. Column headers are kept in a circular doubly-linked list of the keys which still have non-zero demand; the nodes of each column are kept in a circular doubly-linked list of the rows which are still available to choose. Removing and restoring either kind of link is O(1), so each search step can be undone in time proportional to the size of the row it touched.
+class CoverMatrix:
+    def __init__(self, demand:List[int], rows:List[List[Tuple[int, int]]]):
+        num_cols:int = len(demand)
+        self.root:int = num_cols
+        self.demand:List[int] = list(demand) + [0]
+        self.target:List[int] = list(demand) + [0]
+        self.supply:List[int] = [0] * (num_cols + 1)
+        self.size:List[int] = [0] * (num_cols + 1)
+
+        # Column headers (index num_cols is the root of the header list)
+        self.L:List[int] = [ (c - 1) % (num_cols + 1) for c in range(num_cols + 1) ]
+        self.R:List[int] = [ (c + 1) % (num_cols + 1) for c in range(num_cols + 1) ]
+        self.U:List[int] = list(range(num_cols + 1))
+        self.D:List[int] = list(range(num_cols + 1))
+        self.C:List[int] = list(range(num_cols + 1))
+        self.row_of:List[int] = [-1] * (num_cols + 1)
+        self.count:List[int] = [0] * (num_cols + 1)
+
+        # Unlink columns which need nothing
+        for c in range(num_cols):
+            if demand[c] == 0:
+                self.R[self.L[c]] = self.R[c]
+                self.L[self.R[c]] = self.L[c]
+
+        # Row nodes
+        self.row_nodes:List[List[int]] = []
+        for r,row in enumerate(rows):
+            nodes:List[int] = []
+            for c,n in row:
+                x:int = len(self.C)
+                self.C.append(c)
+                self.row_of.append(r)
+                self.count.append(n)
+                self.U.append(self.U[c])
+                self.D.append(c)
+                self.D[self.U[c]] = x
+                self.U[c] = x
+                self.size[c] += 1
+                nodes.append(x)
+            self.row_nodes.append(nodes)
+
+        # Rows which are neither chosen nor excluded
+        num_rows:int = len(rows)
+        self.row_root:int = num_rows
+        self.row_prev:List[int] = [ (r - 1) % (num_rows + 1) for r in range(num_rows + 1) ]
+        self.row_next:List[int] = [ (r + 1) % (num_rows + 1) for r in range(num_rows + 1) ]
+
+    def covered(self) -> bool:
+        return self.R[self.root] == self.root
+
+    ##
+    # @brief Find the uncovered key present in the fewest available rows
+    #
+    # @return The column of that key
+    def most_constrained_column(self) -> int:
+        best:int = self.R[self.root]
+        c:int = self.R[best]
+        while c != self.root:
+            if self.size[c] < self.size[best]:
+                best = c
+            c = self.R[c]
+        return best
+
+    def column_rows(self, c:int) -> List[int]:
+        rows:List[int] = []
+        x:int = self.D[c]
+        while x != c:
+            rows.append(self.row_of[x])
+            x = self.D[x]
+        return rows
+
+    def available_rows(self) -> List[int]:
+        rows:List[int] = []
+        r:int = self.row_next[self.row_root]
+        while r != self.row_root:
+            rows.append(r)
+            r = self.row_next[r]
+        return rows
+
+    ##
+    # @brief Make a row unavailable, i.e. remove it from its columns
+    def withdraw_row(self, r:int):
+        for x in self.row_nodes[r]:
+            self.U[self.D[x]] = self.U[x]
+            self.D[self.U[x]] = self.D[x]
+            self.size[self.C[x]] -= 1
+        self.row_next[self.row_prev[r]] = self.row_next[r]
+        self.row_prev[self.row_next[r]] = self.row_prev[r]
+
+    def restore_row(self, r:int):
+        self.row_next[self.row_prev[r]] = r
+        self.row_prev[self.row_next[r]] = r
+        for x in reversed(self.row_nodes[r]):
+            self.U[self.D[x]] = x
+            self.D[self.U[x]] = x
+            self.size[self.C[x]] += 1
+
+    ##
+    # @brief Use the keys of a row to reduce the demand of its columns, unlinking those which become covered
+    #
+    # @param r:int The row to apply
+    #
+    # @return The amount by which each column's demand was reduced, for use with unapply_row
+    def apply_row(self, r:int) -> List[Tuple[int, int]]:
+        reductions:List[Tuple[int, int]] = []
+        for x in self.row_nodes[r]:
+            c:int = self.C[x]
+            self.supply[c] += self.count[x]
+            reduction:int = min(self.count[x], self.demand[c])
+            if reduction != 0:
+                self.demand[c] -= reduction
+                if self.demand[c] == 0:
+                    self.R[self.L[c]] = self.R[c]
+                    self.L[self.R[c]] = self.L[c]
+                reductions.append((c, reduction))
+        return reductions
+
+    def unapply_row(self, r:int, reductions:List[Tuple[int, int]]):
+        for c,reduction in reversed(reductions):
+            if self.demand[c] == 0:
+                self.R[self.L[c]] = c
+                self.L[self.R[c]] = c
+            self.demand[c] += reduction
+        for x in self.row_nodes[r]:
+            self.supply[self.C[x]] -= self.count[x]
+
+    ##
+    # @brief Check whether applying a row would reduce the demand of any column
+    def useful(self, r:int) -> bool:
+        return any(map(lambda x: self.demand[self.C[x]] > 0, self.row_nodes[r]))
+
+    ##
+    # @brief Check whether an applied row is made redundant by the other applied rows
+    #
+    # @param r:int An applied row
+    #
+    # @return True iff the other applied rows already supply every key of r that is needed
+    def redundant(self, r:int) -> bool:
+        return all(map(lambda x: self.supply[self.C[x]] - self.count[x] >= self.target[self.C[x]], self.row_nodes[r]))
+
+##
+# @brief Lazily enumerate every set of rows which covers the demand of a cover matrix
+#
+# Branches on the most constrained uncovered column. Each row of that column is tried in turn and then excluded from the remaining branches, so every set of rows is reached along exactly one path. A row may stand for several interchangeable copies, in which case each number of copies of it is tried in turn. Covers are yielded as they are found, so the search stops as soon as the consumer does. The search keeps its own stack, so its depth is not limited by that of the interpreter.
+#
+# Different choices of rows can leave the same demand to be met by the same available rows. The states from which no cover could be found may be remembered in dead_states, so that they are not searched again. Forgetting a state only costs repeated work. A table which may report false positives is only consulted once a cover has been found, so that whether any cover exists is still decided exactly. Dead states are not remembered when searching for minimal covers only, as whether a branch is pruned then depends on the rows already chosen.
+#
+# @param matrix:CoverMatrix The matrix to search
+# @param minimal_only:bool Prune any branch in which a chosen row has become redundant, so only inclusion-minimal covers are yielded
+# @param copies:List[int] The number of copies of each row which may be chosen, one each if not given
+# @param useful_copies_only:bool Only choose another copy of a row while it would still reduce some demand
+# @param stats:SearchStatistics Counters to update and the deadline by which to stop, if any
+# @param dead_states:LruMemo|BloomFilter The table of states from which no cover can be found, if any
+#
+# @return An iterator of pairs of the chosen rows, each repeated once per copy, and the rows which may optionally be added to them. The list of chosen rows is reused by the search so must be copied if kept
+def search_covers(matrix:CoverMatrix, minimal_only:bool=False, copies:List[int]=None, useful_copies_only:bool=False, stats:SearchStatistics=None, dead_states:object=None) -> Iterator[Tuple[List[int], List[int]]]:
+    chosen:List[int] = []
+    row_copies:List[int] = copies if copies is not None else [1] * len(matrix.row_nodes)
+    remember_dead_states:bool = dead_states is not None and not minimal_only
+    num_covers:int = 0
+
+    # Each frame holds the rows of the column being branched on, the position of the row being tried, the demand reductions of each of its applied copies, whether further copies are pointless, and the state of the node with the number of covers found before it
+    stack:List[list] = []
+
+    ##
+    # @brief Move to the next node to expand, undoing and excluding the rows of finished branches
+    #
+    # @return Whether there is a node to expand
+    def advance() -> bool:
+        while stack != []:
+            frame:list = stack[-1]
+            rows:List[int] = frame[0]
+            applications:List[List[Tuple[int, int]]] = frame[2]
+            if frame[1] >= 0:
+                # Try another copy of the current row
+                r:int = rows[frame[1]]
+                if not frame[3] and len(applications) < row_copies[r] and (applications == [] or not useful_copies_only or matrix.useful(r)):
+                    applications.append(matrix.apply_row(r))
+                    chosen.append(r)
+                    # Further copies cannot make a redundant row necessary again
+                    if minimal_only and any(map(matrix.redundant, chosen)):
+                        frame[3] = True
+                        if stats is not None:
+                            stats.branches_pruned += 1
+                        continue
+                    return True
+                for reductions in reversed(applications):
+                    chosen.pop()
+                    matrix.unapply_row(r, reductions)
+                frame[2] = []
+                frame[3] = False
+
+            # Move on to the next row, excluding it from the remaining branches
+            frame[1] += 1
+            if frame[1] < len(rows):
+                matrix.withdraw_row(rows[frame[1]])
+            else:
+                for r in reversed(rows):
+                    matrix.restore_row(r)
+                stack.pop()
+                if remember_dead_states and frame[5] == num_covers:
+                    dead_states.add(frame[4])
+        return False
+
+    def _search_covers() -> Iterator[Tuple[List[int], List[int]]]:
+        nonlocal num_covers
+        while True:
+            if stats is not None:
+                if stats.out_of_time():
+                    return
+                stats.nodes_expanded += 1
+                stats.observe_stack_depth(len(stack))
+            if matrix.covered():
+                num_covers += 1
+                yield (chosen, matrix.available_rows())
+            else:
+                state:tuple = None
+                if remember_dead_states:
+                    state = (tuple(matrix.demand), tuple(matrix.available_rows()))
+                if state is not None and (num_covers != 0 or not dead_states.false_positives) and state in dead_states:
+                    if stats is not None:
+                        stats.memo_hits += 1
+                else:
+                    stack.append([matrix.column_rows(matrix.most_constrained_column()), -1, [], False, state, num_covers])
+                    if stats is not None:
+                        stats.observe_memo_size(len(dead_states) if remember_dead_states else 0)
+            if not advance():
+                return
+    return _search_covers()
+
+##
+# @brief Find a set of rows which covers the demand of a cover matrix at least cost, by branch and bound
+#
+# Costs are pairs, compared lexicographically: the primary cost is minimised and the secondary cost breaks ties, any remaining ties are broken by the tie_break key of the chosen rows. A branch is pruned when an admissible lower bound on its primary cost cannot improve on the best cover found so far. The bound divides the weight of the remaining demand by the best ratio of useful weight supplied to primary cost among the available rows, i.e. it is the value of the fractional relaxation of the remaining problem.
+#
+# A row is dominated by another if the other supplies at least as much of every column at a strictly lower cost. Once a dominating row has been excluded, any cover which uses the dominated row in its place is strictly worse than one already considered, so the dominated row is excluded too.
+#
+# @param matrix:CoverMatrix The matrix to search
+# @param row_costs:List[Tuple[float, float]] The primary and secondary cost of each row, both positive
+# @param column_weights:List[float] The weight of a single copy of each column's key
+# @param tie_break:Callable Maps the sorted list of chosen rows to a comparable key
+# @param dominators:List[List[int]] The rows which dominate each row, if any are known
+# @param stats:SearchStatistics Counters to update and the deadline by which to stop, if any
+#
+# @return The sorted list of rows of an optimal cover, or None if the demand cannot be met. If the deadline passes, the best cover found so far is returned
+def search_optimal_cover(matrix:CoverMatrix, row_costs:List[Tuple[float, float]], column_weights:List[float], tie_break:Callable, dominators:List[List[int]]=None, stats:SearchStatistics=None) -> List[int]:
+    epsilon:float = 1e-9
+    best:Tuple[float, float, object, List[int]] = None
+    chosen:List[int] = []
+    row_dominators:List[List[int]] = dominators if dominators is not None else [[]] * len(matrix.row_nodes)
+    excluded_rows:List[bool] = [False] * len(matrix.row_nodes)
+
+    def useful_weight(r:int) -> float:
+        return sum(map(lambda x: min(matrix.count[x], matrix.demand[matrix.C[x]]) * column_weights[matrix.C[x]], matrix.row_nodes[r]))
+
+    def primary_lower_bound(c:int) -> float:
+        remaining_weight:float = 0.0
+        d:int = matrix.R[matrix.root]
+        while d != matrix.root:
+            remaining_weight += matrix.demand[d] * column_weights[d]
+            d = matrix.R[d]
+        best_ratio:float = max(map(lambda r: useful_weight(r) / row_costs[r][0], matrix.available_rows()), default=0.0)
+        cheapest_choice:float = min(map(lambda r: row_costs[r][0], matrix.column_rows(c)), default=float('inf'))
+        if best_ratio == 0.0:
+            return float('inf')
+        return max(remaining_weight / best_ratio, cheapest_choice)
+
+    # Each frame holds the rows of the column being branched on, the position of the row being tried, its demand reductions if it was applied, and the costs of the rows chosen before it
+    stack:List[list] = []
+
+    def expand(primary:float, secondary:float):
+        nonlocal best
+        if stats is not None:
+            stats.nodes_expanded += 1
+            stats.observe_stack_depth(len(stack))
+        if matrix.covered():
+            rows:List[int] = sorted(chosen)
+            candidate:Tuple[float, float, object, List[int]] = (primary, secondary, tie_break(rows), rows)
+            if best is None or candidate[:3] < best[:3]:
+                best = candidate
+            return
+
+        c:int = matrix.most_constrained_column()
+        if best is not None:
+            bound:float = primary + primary_lower_bound(c)
+            if bound > best[0] + epsilon or (bound >= best[0] - epsilon and secondary > best[1] + epsilon):
+                if stats is not None:
+                    stats.branches_pruned += 1
+                return
+
+        # Try the most cost-effective rows first to find good covers early
+        stack.append([sorted(matrix.column_rows(c), key=lambda r: row_costs[r][0] / useful_weight(r)), -1, None, primary, secondary])
+
+    ##
+    # @brief Move to the next node to expand, undoing and excluding the rows of finished branches
+    #
+    # @return The costs of the next node to expand, or None if the search is complete
+    def advance() -> Tuple[float, float]:
+        while stack != []:
+            frame:list = stack[-1]
+            rows:List[int] = frame[0]
+            if frame[1] >= 0:
+                r:int = rows[frame[1]]
+                if frame[2] is not None:
+                    chosen.pop()
+                    matrix.unapply_row(r, frame[2])
+                    frame[2] = None
+                excluded_rows[r] = True
+
+            frame[1] += 1
+            if frame[1] < len(rows):
+                r:int = rows[frame[1]]
+                matrix.withdraw_row(r)
+                if any(map(lambda d: excluded_rows[d], row_dominators[r])):
+                    if stats is not None:
+                        stats.branches_pruned += 1
+                    continue
+                frame[2] = matrix.apply_row(r)
+                chosen.append(r)
+                return (frame[3] + row_costs[r][0], frame[4] + row_costs[r][1])
+
+            for r in reversed(rows):
+                excluded_rows[r] = False
+                matrix.restore_row(r)
+            stack.pop()
+        return None
+
+    costs:Tuple[float, float] = (0.0, 0.0)
+    while costs is not None and (stats is None or not stats.out_of_time()):
+        expand(*costs)
+        costs = advance()
+
+    return best[3] if best is not None else None
@@ -0,0 +1,65 @@
+from typing import List, Tuple
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Sums of multiples of this fraction of a unit are exact in any order, so match those of the pure-Python path
+exact_unit_fraction:int = 64
+
+# The largest number of layout-key counts for which the matrices are built, beyond this the dictionaries of the key index are used instead
+max_incidence_cells:int = 2 ** 24
+
+##
+# @brief Count the occurrences of each key in each layout as matrices, so that the count-based analyses of all layouts are computed as a few array operations
+#
+# Requires numpy, without which (or if the matrices would be too large) the analyses fall back to the key index.
+#
+# @param keeb_layouts:List[Tuple[str, List[int]]] The keyboards
+# @param kit_layouts:List[Tuple[str, List[int]]] The kits
+# @param key_units:[float] The units of each key, by id
+#
+# @return The units of each layout by name under 'units' (None if these could not be summed exactly), and for each of 'keebs' and 'kits', the row of each of its layouts under 'rows' and under 'uncovered' the number of occurrences of each key (in each row) not matched by an occurrence in the layouts of the other role, or None if numpy is unavailable
+def build_incidence(keeb_layouts:List[Tuple[str, List[int]]], kit_layouts:List[Tuple[str, List[int]]], key_units:[float]) -> dict:
+    if numpy is None or (len(keeb_layouts) + len(kit_layouts)) * len(key_units) > max_incidence_cells:
+        return None
+
+    keeb_counts:'numpy.ndarray' = count_matrix(keeb_layouts, len(key_units))
+    kit_counts:'numpy.ndarray' = count_matrix(kit_layouts, len(key_units))
+    units:'numpy.ndarray' = numpy.array(key_units, dtype=numpy.float64)
+    layout_units:dict = None
+    if numpy.all(units * exact_unit_fraction == numpy.floor(units * exact_unit_fraction)):
+        layout_units = {}
+        for layouts,counts in [(keeb_layouts, keeb_counts), (kit_layouts, kit_counts)]:
+            layout_units.update(zip(map(lambda l: l[0], layouts), (counts @ units).tolist()))
+
+    return {
+        'units': layout_units,
+        'keebs': {
+            'rows': { l[0]: i for i,l in enumerate(keeb_layouts) },
+            'uncovered': numpy.maximum(keeb_counts - kit_counts.sum(axis=0, dtype=numpy.int32), 0),
+        },
+        'kits': {
+            'rows': { l[0]: i for i,l in enumerate(kit_layouts) },
+            'uncovered': numpy.maximum(kit_counts - keeb_counts.sum(axis=0, dtype=numpy.int32), 0),
+        },
+    }
+
+def count_matrix(layouts:List[Tuple[str, List[int]]], num_keys:int) -> 'numpy.ndarray':
+    counts:'numpy.ndarray' = numpy.zeros((len(layouts), num_keys), dtype=numpy.int32)
+    for row,(_,keys) in enumerate(layouts):
+        numpy.add.at(counts[row], numpy.asarray(keys, dtype=numpy.intp), 1)
+    return counts
+
+##
+# @brief Find the uncovered keys of a layout from the incidence matrices
+#
+# @param role_incidence:dict The incidence of the role of the layout
+# @param layout:Tuple[str, List[int]] The layout
+#
+# @return The keys of the layout left uncovered, in the same order as get_uncovered
+def incidence_uncovered(role_incidence:dict, layout:Tuple[str, List[int]]) -> List[int]:
+    (keys, first_occurrences) = numpy.unique(numpy.asarray(layout[1], dtype=numpy.intp), return_index=True)
+    remaining:'numpy.ndarray' = role_incidence['uncovered'][role_incidence['rows'][layout[0]], keys]
+    uncovered:'numpy.ndarray' = remaining > 0
+    return keys[uncovered][numpy.lexsort((first_occurrences[uncovered], remaining[uncovered]))].tolist()
@@ -0,0 +1,71 @@
+from .key import Key
+from .layout_cache import entry_name, file_entry_name, LayoutCache
+from .parse_kle import parse_kle_file, parse_kle_string
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from os.path import exists, getsize
+from sys import exit, stderr
+from typing import List, Tuple
+
+# Files larger than this many bytes are hashed and parsed as they are read, rather than being read whole
+streaming_threshold:int = 8 * 2 ** 20
+
+##
+# @brief Read and parse the layouts in some files concurrently
+#
+# Reading the files and looking them up in the cache is mostly waiting for I/O, so is done by a pool of threads. Parsing holds the interpreter lock, so the layouts not in the cache are parsed by a pool of processes if more than one job is allowed. Files larger than streaming_threshold are never held whole in memory.
+#
+# @param jobs:int The number of processes which may parse layouts at once
+# @param layout_cache:LayoutCache The layouts parsed by previous runs, or None
+# @param fnames:[str] Names of the files to read
+#
+# @return The named layouts of the files, in the same order
+def read_layouts(jobs:int, layout_cache:LayoutCache, fnames:[str]) -> List[Tuple[str, List[Key]]]:
+    with ThreadPoolExecutor() as io_pool:
+        contents:List[bytes] = []
+        entries:[str] = []
+        layouts:List[List[Key]] = []
+        for (fcontents,entry,layout) in io_pool.map(partial(read_layout_file, layout_cache), fnames):
+            contents.append(fcontents)
+            entries.append(entry)
+            layouts.append(layout)
+
+        # Parse the layouts which were not cached
+        to_parse:[int] = list(filter(lambda i: layouts[i] is None, range(len(fnames))))
+        parse_args:Tuple[List[str], List[str]] = (list(map(lambda i: fnames[i], to_parse)), list(map(lambda i: contents[i].decode('utf-8') if contents[i] is not None else None, to_parse)))
+        parsed_layouts:List[List[Key]]
+        if jobs > 1 and len(to_parse) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as parse_pool:
+                parsed_layouts = list(parse_pool.map(parse_layout, *parse_args, chunksize=max(1, len(to_parse) // (4 * jobs))))
+        else:
+            parsed_layouts = list(map(parse_layout, *parse_args))
+        for i,layout in zip(to_parse, parsed_layouts):
+            layouts[i] = layout
+
+        if layout_cache is not None:
+            list(io_pool.map(lambda i: layout_cache.store(entries[i], layouts[i]), to_parse))
+
+    return list(zip(fnames, layouts))
+
+##
+# @brief Read a layout file and look it up in the cache
+#
+# @param layout_cache:LayoutCache The layouts parsed by previous runs, or None
+# @param fname:str Name of the file
+#
+# @return The contents of the file (None if it is to be streamed), the name of its cache entry (None if there is no cache) and its cached layout (None if not cached)
+def read_layout_file(layout_cache:LayoutCache, fname:str) -> Tuple[bytes, str, List[Key]]:
+    contents:bytes = None
+    if not exists(fname):
+        print('Couldn\'t find or read file "%s"' % fname, file=stderr)
+        exit(1)
+    if getsize(fname) <= streaming_threshold:
+        with open(fname, 'rb') as f:
+            contents = f.read()
+    if layout_cache is None:
+        return (contents, None, None)
+    entry:str = entry_name(fname, contents) if contents is not None else file_entry_name(fname)
+    return (contents, entry, layout_cache.lookup(entry))
+
+def parse_layout(fname:str, contents:str) -> List[Key]:
+    return parse_kle_string(fname, contents) if contents is not None else parse_kle_file(fname)
@@ -0,0 +1,81 @@
+from .util import default_cap_colour, default_text_colour, fst, special_properties
+
+# The properties of a keycap, in the order in which they are passed to intern_key
+key_properties:[str] = ['p', 'w', 'h', 'w2', 'h2', 'x2', 'y2', 'l', 'n', 'c', 't', 'key']
+
+##
+# @brief An immutable keycap. Keycaps with the same properties are interned to the same object by intern_key, so their names are computed only once
+class Key:
+    __slots__ = key_properties + ['pretty_name']
+    p:str
+    w:float
+    h:float
+    w2:float
+    h2:float
+    x2:float
+    y2:float
+    l:bool
+    n:bool
+    c:str
+    t:str
+    key:str
+    pretty_name:str
+
+    def __init__(self, *props):
+        for prop,value in zip(key_properties, props):
+            object.__setattr__(self, prop, value)
+        object.__setattr__(self, 'pretty_name', key_pretty_name(self))
+
+    def __setattr__(self, name:str, value:object):
+        raise AttributeError('Keys are immutable, cannot set "%s"' % name)
+
+    def __reduce__(self) -> tuple:
+        return (intern_key, self.props())
+
+    def __repr__(self) -> str:
+        return 'Key(%s)' % self.pretty_name
+
+    @property
+    def serialised(self) -> str:
+        return self.pretty_name
+
+    def props(self) -> tuple:
+        return tuple(map(lambda prop: getattr(self, prop), key_properties))
+
+    ##
+    # @brief Represent the key as a dictionary for output
+    #
+    # @return The properties of the key along with its names
+    def as_dict(self) -> dict:
+        return dict(zip(key_properties, self.props()), **{ 'serialised': self.serialised, 'pretty-name': self.pretty_name })
+
+interned_keys:dict = {}
+
+##
+# @brief Obtain the key with the given properties, creating it only if no such key exists already
+#
+# @param props:tuple The values of the properties of the key, in the order of key_properties
+#
+# @return The unique key with these properties
+def intern_key(*props) -> Key:
+    key:Key = interned_keys.get(props)
+    if key is None:
+        key = Key(*props)
+        interned_keys[props] = key
+    return key
+
+def key_pretty_name(key:Key) -> str:
+    name:str = key.key.replace('\n', '_').replace(' ', '+')
+    dimensions:str = '%.2fx%.2f' %(key.w, key.h)
+    if (key.w2 != key.w or key.h2 != key.h) and (key.w2 != 1.0 or key.h2 != 1.0):
+        dimensions += '[%.2fx%.2f]' % (key.w2, key.h2)
+    key_props:str = ''
+    for flag,cond in sorted(special_properties.items(), key=fst):
+        if cond(key):
+            key_props += flag
+    key_colours:[str] = []
+    for colour_key,pretty_colour_key,default_colour in [('c', '𝕔', default_cap_colour), ('t', '𝕥', default_text_colour)]:
+        if getattr(key, colour_key) != default_colour:
+            key_colours.append(pretty_colour_key + getattr(key, colour_key))
+
+    return '-'.join([name, dimensions] + ([key_props] if key_props else []) + key_colours)
@@ -0,0 +1,158 @@
+from .key import Key
+from .parse_kle import parser_version
+from functools import partial
+from hashlib import blake2b
+from os import environ, listdir, makedirs, remove, replace, stat, stat_result, utime
+from os.path import expanduser, join, splitext
+from pickle import dumps, HIGHEST_PROTOCOL, loads
+from re import fullmatch
+from stat import S_IWGRP, S_IWOTH
+from sys import stderr
+from tempfile import NamedTemporaryFile
+from time import time
+from typing import List, Tuple
+try:
+    from os import getuid
+except ImportError:
+    getuid = None
+
+# The names of the files of complete entries and of those still being written
+entry_pattern:str = r'[0-9a-f]{40}\.pickle'
+temporary_entry_pattern:str = r'\.tmp-.*'
+
+# Bytes of a file hashed at once when naming its entry without reading it whole
+hash_chunk_size:int = 2 ** 20
+
+# Seconds after which an entry still being written must have been abandoned by its run
+stale_temporary_entry_age:float = 60 * 60
+
+##
+# @brief A directory of parsed layouts, each named by a hash of the contents of the file it was parsed from and the version of the parser
+#
+# Entries are written to temporary files which are then renamed into place, so concurrent runs only ever see complete entries. Reading an entry touches it, so that the least-recently-used entries are removed first when the cache grows beyond its budget. Any failure to use the cache just means that the file is parsed.
+#
+# Entries are unpickled, so the directory must only be writable by the user: it is created private, and is not read if others may write to it. Only files named as entries are ever removed.
+class LayoutCache:
+    directory:str
+    budget:int
+    trusted:bool
+
+    def __init__(self, directory:str, budget:int):
+        self.directory = directory
+        self.budget = budget
+        self.trusted = None
+
+    ##
+    # @brief Check (once) that no other user could have written the entries of the cache
+    #
+    # @return Whether the directory is owned by the user and not writable by others, or does not exist yet
+    def is_trusted(self) -> bool:
+        if self.trusted is None:
+            try:
+                dir_stat:stat_result = stat(self.directory)
+                self.trusted = (getuid is None or dir_stat.st_uid == getuid()) and not dir_stat.st_mode & (S_IWGRP | S_IWOTH)
+                if not self.trusted:
+                    print('Not using layout cache "%s" as other users may write to it' % self.directory, file=stderr)
+            except OSError:
+                self.trusted = True
+        return self.trusted
+
+    ##
+    # @brief Find the layout previously parsed from a file with the given contents
+    #
+    # @param name:str Name of the entry of the file, from entry_name or file_entry_name
+    #
+    # @return The keys of the layout if cached, otherwise None
+    def lookup(self, name:str) -> [Key]:
+        if not self.is_trusted():
+            return None
+        entry:str = join(self.directory, name)
+        try:
+            with open(entry, 'rb') as f:
+                layout:[Key] = loads(f.read())
+        except Exception:
+            # The entry is absent, or was not written by a compatible version of Python
+            return None
+
+        # Mark the entry as recently used
+        try:
+            utime(entry)
+        except OSError:
+            pass
+        return layout
+
+    ##
+    # @brief Remember the layout parsed from a file with the given contents
+    #
+    # @param name:str Name of the entry of the file, from entry_name or file_entry_name
+    # @param layout:[Key] The keys parsed from the file
+    def store(self, name:str, layout:[Key]):
+        if not self.is_trusted():
+            return
+        try:
+            makedirs(self.directory, mode=0o700, exist_ok=True)
+            with NamedTemporaryFile(dir=self.directory, prefix='.tmp-', delete=False) as f:
+                f.write(dumps(layout, protocol=HIGHEST_PROTOCOL))
+            replace(f.name, join(self.directory, name))
+        except OSError:
+            pass
+
+    ##
+    # @brief Remove the least-recently-used entries until the cache fits in its budget, along with any entries abandoned while being written. Files which are not entries are left alone
+    def evict(self):
+        names:[str]
+        try:
+            names = listdir(self.directory)
+        except OSError:
+            return
+
+        foreign_names:[str] = list(filter(lambda n: fullmatch(entry_pattern, n) is None and fullmatch(temporary_entry_pattern, n) is None, names))
+        if foreign_names != []:
+            print('Layout cache "%s" contains files which are not cached layouts (such as "%s"), these are left alone' % (self.directory, foreign_names[0]), file=stderr)
+
+        # Entries may be removed by concurrent runs at any time
+        entries:List[Tuple[float, int, str]] = []
+        for name in names:
+            path:str = join(self.directory, name)
+            try:
+                entry_stat:stat_result = stat(path)
+                if fullmatch(entry_pattern, name) is not None:
+                    entries.append((entry_stat.st_mtime, entry_stat.st_size, path))
+                elif fullmatch(temporary_entry_pattern, name) is not None and time() - entry_stat.st_mtime > stale_temporary_entry_age:
+                    remove(path)
+            except OSError:
+                pass
+
+        size:int = sum(map(lambda e: e[1], entries))
+        for _,entry_size,path in sorted(entries):
+            if size <= self.budget:
+                break
+            try:
+                remove(path)
+            except OSError:
+                pass
+            size -= entry_size
+
+def entry_name(fname:str, contents:bytes) -> str:
+    digest:blake2b = entry_digest(fname)
+    digest.update(contents)
+    return digest.hexdigest() + '.pickle'
+
+##
+# @brief Name the entry of a file as entry_name does, but reading the file a piece at a time rather than whole
+#
+# @param fname:str Name of the file
+#
+# @return The name of the entry
+def file_entry_name(fname:str) -> str:
+    digest:blake2b = entry_digest(fname)
+    with open(fname, 'rb') as f:
+        for chunk in iter(partial(f.read, hash_chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest() + '.pickle'
+
+def entry_digest(fname:str) -> blake2b:
+    return blake2b(b'%d:%s:' % (parser_version, splitext(fname)[1].lower().encode('utf-8')), digest_size=20)
+
+def default_cache_dir() -> str:
+    return join(environ.get('XDG_CACHE_HOME', expanduser(join('~', '.cache'))), 'keycov')
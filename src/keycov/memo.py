@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from math import ceil, log
+from sys import getsizeof
+
+# Rough cost of an entry in an OrderedDict beyond its key and value
+entry_overhead:int = 100
+
+##
+# @brief A memo table bounded by an approximate memory budget, which evicts its least-recently-used entries first
+#
+# Keys are expected to be tuples of tuples, strings and numbers, whose size is estimated shallowly: the contents of strings are assumed to be shared with the rest of the program.
+class LruMemo:
+    false_positives:bool = False
+
+    def __init__(self, budget:float):
+        self.budget:float = budget
+        self.size:int = 0
+        self.entries:OrderedDict = OrderedDict()
+        self.hits:int = 0
+        self.misses:int = 0
+        self.evictions:int = 0
+
+    def __contains__(self, key:tuple) -> bool:
+        return key in self.entries
+
+    def __getitem__(self, key:tuple) -> object:
+        self.entries.move_to_end(key)
+        return self.entries[key][0]
+
+    def __setitem__(self, key:tuple, value:object):
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        entry_size:int = entry_overhead + estimate_size(key) + getsizeof(value)
+        if entry_size > self.budget:
+            return
+        self.entries[key] = (value, entry_size)
+        self.size += entry_size
+        while self.size > self.budget:
+            self.size -= self.entries.popitem(last=False)[1][1]
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, key:tuple):
+        self[key] = True
+
+    ##
+    # @brief Look up a key, counting whether it was present
+    #
+    # @param key:tuple The key to look up
+    #
+    # @return The value of the key, or None if it is not present
+    def get(self, key:tuple) -> object:
+        if key in self.entries:
+            self.hits += 1
+            return self[key]
+        self.misses += 1
+        return None
+
+def estimate_size(obj:object) -> int:
+    if type(obj) == tuple:
+        return getsizeof(obj) + sum(map(lambda o: estimate_size(o) if type(o) == tuple else 0, obj))
+    return getsizeof(obj)
+
+##
+# @brief A set of tuples in bounded memory which may report that it contains keys which were never added
+#
+# Each key sets num_hashes bits chosen by double hashing. The number of keys stored before the filter is cleared is chosen so that, while the filter holds at most that many, the chance that a key which was not added is reported present is at most false_positive_rate. Clearing the filter forgets every key at once, so this bound always holds. The filter starts small and doubles in size each time it is cleared, until it reaches its budget.
+class BloomFilter:
+    false_positives:bool = True
+
+    def __init__(self, budget:float, false_positive_rate:float=0.01, initial_size:int=2 ** 12):
+        self.budget:float = budget
+        self.false_positive_rate:float = false_positive_rate
+        self.num_hashes:int = max(1, ceil(-log(false_positive_rate, 2)))
+        self.clears:int = 0
+        self.allocate(min(initial_size, int(min(budget, 2 ** 40))))
+
+    def allocate(self, size:int):
+        self.bits:bytearray = bytearray(max(8, size))
+        self.num_bits:int = len(self.bits) * 8
+        self.capacity:int = max(1, int(self.num_bits * log(2) ** 2 / -log(self.false_positive_rate)))
+        self.size:int = 0
+
+    def positions(self, key:tuple) -> [int]:
+        h:int = hash(key)
+        h1:int = h & 0xffffffff
+        h2:int = (h >> 32) | 1
+        return list(map(lambda i: (h1 + i * h2) % self.num_bits, range(self.num_hashes)))
+
+    def __contains__(self, key:tuple) -> bool:
+        return all(map(lambda p: self.bits[p >> 3] >> (p & 7) & 1, self.positions(key)))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, key:tuple):
+        if self.size >= self.capacity:
+            self.allocate(int(min(2 * len(self.bits), max(len(self.bits), min(self.budget, 2 ** 40)))))
+            self.clears += 1
+        for p in self.positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.size += 1
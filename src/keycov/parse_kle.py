@@ -1,7 +1,9 @@
-from .util import default_cap_colour, default_text_colour, flatten, iconcat
-from .yaml_io import read_yaml
+from .key import intern_key, Key
+from .util import default_cap_colour, default_text_colour, iter_flattened
+from .yaml_io import parse_yaml, read_yaml, stream_flattened_yaml
 from types import SimpleNamespace
-from typing import Union
+from yaml import YAMLError
+from typing import Iterator, Union
 
 parser_initial_state:dict = {
     'p': 'R2',
@@ -22,15 +24,50 @@ parser_state_keys:[dict] = parser_initial_state.keys()
 parser_state_reset_keys:[str] = ['d', 'w', 'h', 'w2', 'h2', 'x2', 'y2', 'l', 'n']
 parser_state_output_keys:[str] = ['p', 'w', 'h', 'w2', 'h2', 'x2', 'y2', 'l', 'n', 'c', 't']
 
-def parse_kle(fname:str) -> [dict]:
-    return parse_kle_raw(read_yaml(fname))
+# Version of the parser output, to be incremented whenever the keys output for a given file change so that cached layouts are not reused
+parser_version:int = 1
 
-def parse_kle_raw(layout:Union[Union[str,dict],str]) -> [dict]:
-    parser_state:SimpleNamespace = SimpleNamespace(**parser_initial_state)
+def parse_kle(fname:str) -> [Key]:
+    return list(parse_kle_raw(read_yaml(fname)))
+
+def parse_kle_string(fname:str, contents:str) -> [Key]:
+    return list(parse_kle_raw(parse_yaml(fname, contents)))
+
+##
+# @brief Parse a KLE file as it is read, so that the memory used does not grow with the size of the file. Files which cannot be streamed are parsed whole
+#
+# @param fname:str Name of the file
+#
+# @return The keys of the layout
+def parse_kle_file(fname:str) -> [Key]:
+    try:
+        with open(fname, 'r', encoding='utf-8') as f:
+            return list(parse_kle_stream(f))
+    except YAMLError:
+        # Leading tabs and anchors need the whole document
+        return parse_kle(fname)
+
+def parse_kle_raw(layout:Union[Union[str,dict],str]) -> Iterator[Key]:
+    return parse_kle_items(iter_flattened(layout))
 
-    # Flatten and parse the structure
-    parsed_layout:[dict] = []
-    for cap in flatten(layout):
+##
+# @brief Parse a KLE document as it is read, without loading it whole
+#
+# @param stream:object A file or string containing the document
+#
+# @return An iterator over the keys of the layout
+def parse_kle_stream(stream:object) -> Iterator[Key]:
+    return parse_kle_items(stream_flattened_yaml(stream))
+
+##
+# @brief Lazily parse the keys of a layout from the items of its rows, each of which is a keycap legend or some properties which apply to those after it
+#
+# @param items:Iterator[Union[dict, str]] The items of the rows of the layout, in order
+#
+# @return An iterator over the keys of the layout
+def parse_kle_items(items:Iterator[Union[dict, str]]) -> Iterator[Key]:
+    parser_state:SimpleNamespace = SimpleNamespace(**parser_initial_state)
+    for cap in items:
         # Update parser state
         if type(cap) == dict:
             for cap_key in cap.keys():
@@ -38,15 +75,8 @@ def parse_kle_raw(layout:Union[Union[str,dict],str]) -> [dict]:
                     setattr(parser_state, cap_key, cap[cap_key])
         elif type(cap) == str:
             if not parser_state.d and not parser_state.g:
-                parsed_cap:dict = copy_output_keys(parser_state, parser_state_output_keys)
-                parsed_cap['key'] = cap
-                parsed_layout.append(parsed_cap)
+                yield intern_key(*map(lambda k: getattr(parser_state, k), parser_state_output_keys), cap)
 
             # Reset parser state
             for reset_key in parser_state_reset_keys:
                 setattr(parser_state, reset_key, parser_initial_state[reset_key])
-
-    return parsed_layout
-
-def copy_output_keys(state:SimpleNamespace, output_keys:[str]) -> dict:
-    return { k:v for k,v in state.__dict__.items() if k in output_keys }
@@ -0,0 +1,69 @@
+from time import perf_counter, time
+
+##
+# @brief Counters which describe the work done by the covering-set searches on a layout, and the time by which they must stop
+#
+# Deadlines are given as wall-clock times so that they are shared by worker processes.
+class SearchStatistics:
+    def __init__(self, deadline:float=None):
+        self.deadline:float = deadline
+        self.timed_out:bool = False
+        self.nodes_expanded:int = 0
+        self.branches_pruned:int = 0
+        self.memo_hits:int = 0
+        self.peak_memo_size:int = 0
+        self.peak_stack_depth:int = 0
+        self.wall_time:float = 0.0
+        self.start_time:float = None
+
+    def start(self):
+        self.start_time = perf_counter()
+
+    def stop(self):
+        self.wall_time += perf_counter() - self.start_time
+
+    ##
+    # @brief Check whether the deadline has passed, after which it is always considered to have done so
+    #
+    # @return True iff the search must stop
+    def out_of_time(self) -> bool:
+        if not self.timed_out and self.deadline is not None and time() >= self.deadline:
+            self.timed_out = True
+        return self.timed_out
+
+    def observe_stack_depth(self, depth:int):
+        if depth > self.peak_stack_depth:
+            self.peak_stack_depth = depth
+
+    def observe_memo_size(self, size:int):
+        if size > self.peak_memo_size:
+            self.peak_memo_size = size
+
+    def as_dict(self) -> dict:
+        return {
+            'nodes-expanded': self.nodes_expanded,
+            'branches-pruned': self.branches_pruned,
+            'memo-hits': self.memo_hits,
+            'peak-memo-size': self.peak_memo_size,
+            'peak-stack-depth': self.peak_stack_depth,
+            'wall-time': self.wall_time,
+            'timed-out': self.timed_out,
+        }
+
+##
+# @brief Combine the statistics of several searches, as output by SearchStatistics.as_dict
+#
+# @param statistics:[dict] The statistics of each search
+#
+# @return The total counts and times, the greatest peaks, and whether any search timed out
+def merge_statistics(statistics:[dict]) -> dict:
+    merged:dict = SearchStatistics().as_dict()
+    for stats in statistics:
+        for name,value in stats.items():
+            if type(value) == bool:
+                merged[name] = merged[name] or value
+            elif name.startswith('peak-'):
+                merged[name] = max(merged[name], value)
+            else:
+                merged[name] += value
+    return merged
@@ -1,26 +1,40 @@
 from functools import reduce
-from typing import Callable, Tuple
+from itertools import chain, combinations
+from typing import Callable, Iterator, Tuple
 
 default_text_colour:str = '#000000'
 default_cap_colour:str = '#cccccc'
 
 default_terminal_dims:Tuple[int, int] = (80, 24)
 special_properties:dict = {
-    'H': lambda k: k['n'],
-    'I': lambda k: k['w'] == 1.25 \
-        and k['h'] == 2 \
-        and k['w2'] == 1.5 \
-        and k['h2'] == 1 \
-        and k['x2'] == -0.25,
-    'S': lambda k: k['l'],
+    'H': lambda k: k.n,
+    'I': lambda k: k.w == 1.25 \
+        and k.h == 2 \
+        and k.w2 == 1.5 \
+        and k.h2 == 1 \
+        and k.x2 == -0.25,
+    'S': lambda k: k.l,
 }
 
 
-def flatten(obj:object) -> [object]:
-    if type(obj) == list:
-        return reduce(iconcat, map(flatten, obj), [])
-    else:
-        return [obj]
+##
+# @brief Lazily iterate over the items of some nested lists, in order
+#
+# The lists are walked with an explicit stack of iterators, so they are neither copied nor limited in depth by recursion.
+#
+# @param obj:object A list, or any other object
+#
+# @return An iterator over the objects in obj which are not lists, or just obj if it is not a list
+def iter_flattened(obj:object) -> Iterator[object]:
+    iterators:[Iterator[object]] = [iter([obj])]
+    while iterators != []:
+        item:object = next(iterators[-1], iterators)
+        if item is iterators:
+            iterators.pop()
+        elif type(item) == list:
+            iterators.append(iter(item))
+        else:
+            yield item
 
 def concat(a:list, b:list) -> list:
     return a + b
@@ -58,27 +72,49 @@ def add(a:object, b:object) -> object:
 def mult(a:object, b:object) -> object:
     return a * b
 
-def serialise_key(key:dict) -> str:
-    return key_pretty_name(key)
-
-def key_pretty_name(key:dict) -> str:
-    name:str = key['key'].replace('\n', '_').replace(' ', '+')
-    dimensions:str = '%.2fx%.2f' %(key['w'], key['h'])
-    if (key['w2'] != key['w'] or key['h2'] != key['h']) and (key['w2'] != 1.0 or key['h2'] != 1.0):
-        dimensions += '[%.2fx%.2f]' % (key['w2'], key['h2'])
-    key_props:str = ''
-    for flag,cond in sorted(special_properties.items(), key=fst):
-        if cond(key):
-            key_props += flag
-    key_colours:[str] = []
-    for colour_key,pretty_colour_key,default_colour in [('c', '𝕔', default_cap_colour), ('t', '𝕥', default_text_colour)]:
-        if key[colour_key] != default_colour:
-            key_colours.append(pretty_colour_key + key[colour_key])
-
-    return '-'.join([name, dimensions] + ([key_props] if key_props else []) + key_colours)
-
 def compose(f:Callable, g:Callable) -> Callable:
     return lambda x: f(g(x))
 
 def notf(c:bool) -> bool:
     return not c
+
+def powerset(l:list) -> Iterator[tuple]:
+    return chain.from_iterable(map(lambda n: combinations(l, n), range(len(l) + 1)))
+
+##
+# @brief Lazily form the cartesian product of some iterators of lists, concatenating the lists of each combination
+#
+# Unlike itertools.product, no iterator is consumed up-front: items are only drawn as they are first needed. Those of each iterator but the first are kept to be combined again with later items of the iterators before it, so every iterator is consumed at most once. If any iterator but the first is empty, nothing is drawn from the first.
+#
+# @param iterators:[Iterator[list]] The iterators
+#
+# @return An iterator of the concatenated lists of each combination
+def lazy_product(iterators:[Iterator[list]]) -> Iterator[list]:
+    if iterators == []:
+        yield []
+        return
+
+    # The items drawn so far from each iterator but the first
+    drawn:[[list]] = list(map(lambda _: [], iterators[1:]))
+    def item(i:int, j:int) -> list:
+        if j == len(drawn[i]):
+            next_item:list = next(iterators[i + 1], None)
+            if next_item is None:
+                return None
+            drawn[i].append(next_item)
+        return drawn[i][j] if j < len(drawn[i]) else None
+
+    if any(map(lambda i: item(i, 0) is None, range(len(drawn)))):
+        return
+    for head in iterators[0]:
+        # Step through the drawn items like an odometer, the last iterator fastest
+        positions:[int] = [0] * len(drawn)
+        while True:
+            yield head + list(chain.from_iterable(map(lambda p: drawn[p[0]][p[1]], enumerate(positions))))
+            i:int = len(positions) - 1
+            while i >= 0 and item(i, positions[i] + 1) is None:
+                positions[i] = 0
+                i -= 1
+            if i < 0:
+                break
+            positions[i] += 1
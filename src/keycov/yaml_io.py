@@ -1,26 +1,91 @@
-from os.path import exists
+from json import JSONDecodeError, loads as json_loads
+from os.path import exists, splitext
 from re import Match, search
 from sys import exit, stderr
-from yaml import safe_load
+from typing import Iterator, Tuple
+from yaml import AliasEvent, Event, load, MappingEndEvent, MappingStartEvent, ScalarEvent, ScalarNode, SequenceEndEvent, SequenceStartEvent, StreamEndEvent, YAMLError
+from yaml.constructor import SafeConstructor
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
 
 ##
 # @brief Read yaml from a given file or '-' for stdin. Exits on error
 #
+# Files with a .json extension are parsed with the json module unless they are not strictly json (as some KLE exports are not), and yaml is parsed with libyaml if it is available. Leading tabs are only replaced if the file contains a tab.
+#
 # @param fname:str Name of the file to use
 #
 # @return The data present in file fname
 def read_yaml(fname: str) -> dict:
-    yaml_lines:[str]
+    contents:str
     if exists(fname):
         with open(fname, 'r', encoding='utf-8') as f:
-            yaml_lines = f.read().split('\n')
+            contents = f.read()
     else:
         print('Couldn\'t find or read file "%s"' % fname, file=stderr)
         exit(1)
-    sanitised_yaml_string:str = '\n'.join(list(map(sanitise_yaml_line, yaml_lines)))
-    return safe_load(sanitised_yaml_string)
+    return parse_yaml(fname, contents)
+
+##
+# @brief Parse the contents of a yaml or json file, as read_yaml
+#
+# @param fname:str Name of the file, whose extension determines whether it is first tried as json
+# @param contents:str The contents of the file
+#
+# @return The data represented by the contents
+def parse_yaml(fname:str, contents:str) -> dict:
+    if splitext(fname)[1].lower() == '.json':
+        try:
+            return json_loads(contents)
+        except JSONDecodeError:
+            pass
+    if '\t' in contents:
+        contents = '\n'.join(list(map(sanitise_yaml_line, contents.split('\n'))))
+    return load(contents, Loader=SafeLoader)
+
+
+##
+# @brief Lazily iterate over the items of the nested sequences of a yaml (or json) document, as util.iter_flattened does for a loaded document, but without loading it
+#
+# The document is read as a stream of parser events, from which only the mappings and scalars outside of sequences are built, one at a time. Leading tabs are not replaced and anchors are not supported, a YAMLError is raised if either is present.
+#
+# @param stream:object A file or string containing the document
+#
+# @return An iterator over the values in the document which are not sequences, in order
+def stream_flattened_yaml(stream:object) -> Iterator[object]:
+    loader:SafeLoader = SafeLoader(stream)
+    try:
+        # The mappings being built, and the sequences within them, each as a list of items
+        partial_values:[Tuple[type, list]] = []
+        while not loader.check_event(StreamEndEvent):
+            event:Event = loader.get_event()
+            value:object
+            if type(event) == MappingStartEvent or (type(event) == SequenceStartEvent and partial_values != []):
+                partial_values.append((dict if type(event) == MappingStartEvent else list, []))
+                continue
+            elif type(event) in [MappingEndEvent, SequenceEndEvent] and partial_values != []:
+                (value_type, items) = partial_values.pop()
+                value = dict(zip(items[::2], items[1::2])) if value_type == dict else items
+            elif type(event) == ScalarEvent:
+                value = construct_yaml_scalar(loader, event)
+            elif type(event) == AliasEvent:
+                raise YAMLError('Aliases are not supported when streaming yaml')
+            else:
+                continue
+
+            if partial_values == []:
+                yield value
+            else:
+                partial_values[-1][1].append(value)
+    finally:
+        loader.dispose()
 
+def construct_yaml_scalar(loader:SafeLoader, event:ScalarEvent) -> object:
+    tag:str = event.tag if event.tag not in [None, '!'] else loader.resolve(ScalarNode, event.value, event.implicit)
+    return loader.yaml_constructors.get(tag, SafeConstructor.construct_undefined)(loader, ScalarNode(tag, event.value, style=event.style))
 
 def sanitise_yaml_line(line:str) -> str:
     m:Match = search(r'^\t+', line)